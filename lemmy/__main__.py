@@ -0,0 +1,117 @@
+# coding: utf-8
+"""
+Command line tool for lemmatizing CoNLL-U or tab separated files.
+
+Input is read from files or standard input and written to standard output, one chunk of sentences at a time. In
+CoNLL-U input, the LEMMA column is filled in using the FORM and UPOS columns. Tab separated input has a full form and a
+POS tag on each line, and sentences separated by blank lines; the lemma is appended as a third column.
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import itertools
+import sys
+
+from lemmy.lemmatizer import Lemmatizer
+from lemmy.parallel import LemmatizerPool
+
+
+def main(argv=None):
+    """Run the command line tool using specified arguments (or those of the current process)."""
+    args = _parse_args(argv)
+    lemmatize_sentence = _lemmatize_conllu if args.format == "conllu" else _lemmatize_tsv
+    options = (lemmatize_sentence, args.history, args.all)
+    sentences = _read_sentences(args.files)
+    chunks = iter(lambda: list(itertools.islice(sentences, args.chunk_size)), [])
+
+    # Rules from a file are memory mapped, so workers receive a reference to the file rather than a copy of the rules.
+    lemmatizer = Lemmatizer.from_file(args.rules) if args.rules is not None else args.language
+
+    output = io.open(sys.stdout.fileno(), "w", encoding="utf-8", closefd=False)
+    with LemmatizerPool(lemmatizer, args.workers) as pool:
+        _write(output, pool.map_chunks(_lemmatize_chunk, chunks, options))
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m lemmy", description="Lemmatize CoNLL-U or tab separated files.")
+    parser.add_argument("files", nargs="*", default=["-"], help="input files (default: standard input)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("-l", "--language", choices=["da", "sv"], help="use the rules shipping with Lemmy")
+    source.add_argument("-r", "--rules", help="use rules from a file written by Lemmatizer.save")
+    parser.add_argument("-f", "--format", choices=["conllu", "tsv"], default="conllu", help="input format")
+    parser.add_argument("--history", action="store_true",
+                        help="use the POS tag of the previous word in the sentence to resolve ambiguity")
+    parser.add_argument("--all", action="store_true", help="write all lemmas of ambiguous words separated by '|'")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="number of sentences per chunk")
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.chunk_size < 1:
+        parser.error("workers and chunk size must be positive")
+    return args
+
+
+def _read_sentences(paths):
+    """Yield sentences from specified files, as lists of lines (without line breaks)."""
+    for path in paths:
+        if path == "-":
+            file_ = io.open(sys.stdin.fileno(), "r", encoding="utf-8", closefd=False)
+        else:
+            file_ = io.open(path, "r", encoding="utf-8")
+        with file_:
+            sentence = []
+            for line in file_:
+                line = line.rstrip("\r\n")
+                if line.strip():
+                    sentence.append(line)
+                elif sentence:
+                    yield sentence
+                    sentence = []
+            if sentence:
+                yield sentence
+
+
+def _lemmatize_chunk(lemmatizer, sentences, options):
+    lemmatize_sentence, history, all_lemmas = options
+    return ["\n".join(lemmatize_sentence(lemmatizer, sentence, history, all_lemmas)) + "\n\n"
+            for sentence in sentences]
+
+
+def _lemmatize_conllu(lemmatizer, lines, history, all_lemmas):
+    pos_previous = ""
+    for line in lines:
+        fields = line.split("\t")
+        if line.startswith("#") or len(fields) < 4 or not fields[0].isdigit():
+            # Comments, multiword tokens and empty nodes have no lemma of their own.
+            yield line
+            continue
+        form, pos = fields[1], fields[3]
+        fields[2] = _lemma(lemmatizer, form, pos, pos_previous if history else None, all_lemmas)
+        pos_previous = pos
+        yield "\t".join(fields)
+
+
+def _lemmatize_tsv(lemmatizer, lines, history, all_lemmas):
+    pos_previous = ""
+    for line in lines:
+        fields = line.split("\t")
+        form, pos = fields[0], fields[1] if len(fields) > 1 else ""
+        yield "%s\t%s\t%s" % (form, pos, _lemma(lemmatizer, form, pos, pos_previous if history else None, all_lemmas))
+        pos_previous = pos
+
+
+def _lemma(lemmatizer, form, pos, pos_previous, all_lemmas):
+    lemmas = lemmatizer.lemmatize(pos, form, pos_previous)
+    if not lemmas:
+        return form
+    return "|".join(lemmas) if all_lemmas else lemmas[0]
+
+
+def _write(output, results):
+    for result in results:
+        output.write("".join(result))
+        output.flush()
+
+
+if __name__ == "__main__":
+    main()
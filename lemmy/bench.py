@@ -0,0 +1,269 @@
+# coding: utf-8
+"""
+Benchmarks for Lemmy.
+
+Run using `python -m lemmy.bench`. Measures the time and memory needed to load the rules, lemmatization throughput,
+training time per epoch and spaCy pipeline throughput, and writes the results as JSON so they can be compared across
+versions. Words are sampled from the rules of the benchmarked language using a fixed seed, so results are
+reproducible.
+"""
+from __future__ import division, print_function
+
+import argparse
+import json
+import logging
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import lemmy
+from lemmy.version import VERSION
+
+# Share of each word class in the sampled text, roughly following the UD treebanks.
+POS_DISTRIBUTION = [("NOUN", 0.26), ("VERB", 0.16), ("ADP", 0.12), ("ADJ", 0.09), ("PRON", 0.09), ("ADV", 0.08),
+                    ("DET", 0.07), ("PROPN", 0.05), ("AUX", 0.05), ("NUM", 0.03)]
+
+_COLD_LOAD_SCRIPT = """
+import json, sys, time
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def peak_rss():
+    # Kilobytes on Linux, bytes on macOS.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+
+start = time.time()
+import lemmy
+imported = time.time()
+rss_imported = peak_rss()
+lemmatizer = lemmy.load(sys.argv[1], materialize=sys.argv[2] == "1")
+loaded = time.time()
+lemmatizer.lemmatize("NOUN", "a")
+first = time.time()
+json.dump({"import_seconds": imported - start, "load_seconds": loaded - imported,
+           "first_lemmatize_seconds": first - loaded, "import_peak_rss": rss_imported,
+           "load_peak_rss": peak_rss()}, sys.stdout)
+"""
+
+
+def main(argv=None):
+    """Run the benchmarks and write the results as JSON."""
+    parser = argparse.ArgumentParser(prog="python -m lemmy.bench", description="Benchmark Lemmy.")
+    parser.add_argument("-l", "--language", choices=["da", "sv"], default="sv", help="language to benchmark")
+    parser.add_argument("-b", "--benchmarks", default="load,lemmatize,fit,pipe",
+                        help="comma separated list of benchmarks to run (default: all)")
+    parser.add_argument("-n", "--tokens", type=int, default=100000, help="number of tokens to lemmatize")
+    parser.add_argument("--train-size", type=int, default=20000, help="number of training examples for fit")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="repetitions; the best time is reported")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for sampling words")
+    parser.add_argument("-o", "--output", help="file to write results to (default: standard output)")
+    args = parser.parse_args(argv)
+
+    benchmarks = {"load": bench_load, "lemmatize": bench_lemmatize, "fit": bench_fit, "pipe": bench_pipe}
+    results = {
+        "lemmy_version": VERSION,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "language": args.language,
+        "seed": args.seed,
+    }
+    for name in args.benchmarks.split(","):
+        if name not in benchmarks:
+            parser.error("unknown benchmark: %s" % name)
+        results[name] = benchmarks[name](args)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as file_:
+            file_.write(output + "\n")
+    else:
+        print(output)
+
+
+def bench_load(args):
+    """Measure the time and peak memory needed to import Lemmy and load the rules, in fresh processes and warm."""
+    results = {}
+    for mode, materialize in [("mapped", "0"), ("materialized", "1")]:
+        runs = [_cold_load(args.language, materialize) for _ in range(args.repeat)]
+        results["cold_" + mode] = min(runs, key=lambda run: run["import_seconds"] + run["load_seconds"])
+    results["warm_seconds"] = _best_time(lambda: lemmy.load(args.language), args.repeat)
+    return results
+
+
+def bench_lemmatize(args):
+    """Measure lemmatization throughput in tokens per second for various lemmatizer configurations."""
+    rules = lemmy.load(args.language).rules
+    tokens = sample_tokens(rules, args.tokens, random.Random(args.seed))
+    histories = [""] + [pos for pos, _ in tokens[:-1]]
+    configurations = [
+        ("mapped", lambda: lemmy.load(args.language)),
+        ("materialized", lambda: lemmy.load(args.language, materialize=True)),
+        ("trie", lambda: lemmy.Lemmatizer(lemmy.load(args.language, materialize=True).rules, engine="trie")),
+        ("cached", lambda: lemmy.Lemmatizer(lemmy.load(args.language, materialize=True).rules, cache_size=50000)),
+    ]
+
+    results = {"tokens": len(tokens), "distinct_tokens": len(set(tokens))}
+    for name, create in configurations:
+        lemmatizer = create()
+        # Warm up, materializing rules and tries, also for the word classes used with history.
+        lemmatizer.lemmatize_many(tokens)
+        lemmatizer.lemmatize_many([(pos, form, previous) for (pos, form), previous in zip(tokens, histories)])
+        results[name] = {
+            "lemmatize": _throughput(lambda: [lemmatizer.lemmatize(pos, form) for pos, form in tokens], tokens,
+                                     args.repeat),
+            "lemmatize_history": _throughput(
+                lambda: [lemmatizer.lemmatize(pos, form, previous) for (pos, form), previous in zip(tokens, histories)],
+                tokens, args.repeat),
+            "lemmatize_many": _throughput(lambda: lemmatizer.lemmatize_many(tokens), tokens, args.repeat),
+        }
+    return results
+
+
+def bench_fit(args):
+    """Measure training time per epoch on training data made by lemmatizing sampled words with the shipped rules."""
+    reference = lemmy.load(args.language, materialize=True)
+    tokens = sample_tokens(reference.rules, args.train_size, random.Random(args.seed), distinct=True)
+    X, y = [], []
+    for pos, form in tokens:
+        for lemma in reference.lemmatize(pos, form):
+            X.append((pos, form))
+            y.append(lemma)
+
+    results = {"examples": len(X)}
+    for name, kwargs in [("serial", {}), ("worklist", {"worklist": True})]:
+        handler = _EpochRecorder()
+        logging.getLogger().addHandler(handler)
+        level = logging.getLogger().level
+        logging.getLogger().setLevel(logging.DEBUG)
+        try:
+            lemmatizer = lemmy.Lemmatizer()
+            start = time.time()
+            lemmatizer.fit(X, y, **kwargs)
+            total = time.time() - start
+        finally:
+            logging.getLogger().removeHandler(handler)
+            logging.getLogger().setLevel(level)
+        results[name] = {"seconds": total, "epoch_seconds": handler.epoch_seconds, "rules": lemmatizer.rule_count}
+    return results
+
+
+def bench_pipe(args):
+    """
+    Measure spaCy pipeline component throughput in tokens per second, on documents of 20 tokens.
+
+    Components are warmed up first, loading the rules and building lookup structures. The "uncached" component has no
+    cache, so every word is lemmatized, while the cache of the "cached" component holds every word after the warm-up.
+    """
+    try:
+        from spacy.lang.da import Danish
+        from spacy.lang.sv import Swedish
+        from spacy.tokens import Doc
+        from lemmy.pipe.component import LemmyPipelineComponent
+    except ImportError:
+        return {"skipped": "spaCy is not installed"}
+
+    rules = lemmy.load(args.language).rules
+    tokens = sample_tokens(rules, args.tokens, random.Random(args.seed))
+    nlp = (Danish if args.language == "da" else Swedish)()
+
+    docs = []
+    for start in range(0, len(tokens), 20):
+        sentence = tokens[start:start + 20]
+        doc = Doc(nlp.vocab, words=[form for _, form in sentence])
+        for token, (pos, _) in zip(doc, sentence):
+            token.pos_ = pos
+        docs.append(doc)
+
+    results = {"docs": len(docs), "tokens": len(tokens)}
+    for name, cache_size in [("uncached", 0), ("cached", 100000)]:
+        component = LemmyPipelineComponent(args.language, cache_size=cache_size)
+        list(component.pipe(docs, batch_size=256))
+        results[name] = {
+            "call_tokens_per_second": _throughput(lambda: [component(doc) for doc in docs], tokens, args.repeat),
+            "pipe_tokens_per_second": _throughput(lambda: list(component.pipe(docs, batch_size=256)), tokens,
+                                                  args.repeat),
+        }
+    return results
+
+
+def sample_tokens(rules, count, random_, distinct=False):
+    """
+    Sample `(pos, full_form)` pairs using the word class distribution of `POS_DISTRIBUTION`.
+
+    Full forms are the whole words found in the rules of each word class, drawn with Zipfian frequencies, and one in
+    five nouns is turned into a compound by prefixing another noun.
+    """
+    distribution = [(pos, share) for pos, share in POS_DISTRIBUTION if pos in rules]
+    vocabularies = {}
+    for pos, _ in distribution:
+        words = sorted(full_form_suffix for full_form_suffix, rules_list in rules[pos].items()
+                       if rules_list and rules_list[0][1])
+        random_.shuffle(words)
+        vocabularies[pos] = words or sorted(rules[pos])
+
+    tokens = []
+    seen = set()
+    while len(tokens) < count:
+        pos = _weighted_choice(distribution, random_)
+        words = vocabularies[pos]
+        if not words:
+            continue
+        form = words[min(int(random_.paretovariate(1.0)) - 1, len(words) - 1)] if not distinct else \
+            random_.choice(words)
+        if pos == "NOUN" and random_.random() < 0.2:
+            form = random_.choice(words) + form
+        if distinct and (pos, form) in seen:
+            if len(seen) >= sum(len(words_) for words_ in vocabularies.values()):
+                break
+            continue
+        seen.add((pos, form))
+        tokens.append((pos, form))
+    return tokens
+
+
+def _weighted_choice(distribution, random_):
+    threshold = random_.random() * sum(share for _, share in distribution)
+    for pos, share in distribution:
+        threshold -= share
+        if threshold <= 0:
+            return pos
+    return distribution[-1][0]
+
+
+def _cold_load(language, materialize):
+    output = subprocess.check_output([sys.executable, "-c", _COLD_LOAD_SCRIPT, language, materialize])
+    return json.loads(output.decode("utf-8"))
+
+
+def _best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _throughput(function, tokens, repeat):
+    return len(tokens) / _best_time(function, repeat)
+
+
+class _EpochRecorder(logging.Handler):
+    """Collects the durations logged by `Lemmatizer.fit` for each epoch."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.epoch_seconds = []
+
+    def emit(self, record):
+        if record.msg.startswith("epoch #"):
+            self.epoch_seconds.append(record.args[-1])
+
+
+if __name__ == "__main__":
+    main()
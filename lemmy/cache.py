@@ -0,0 +1,47 @@
+# coding: utf-8
+"""A size-bounded least recently used cache."""
+from collections import namedtuple, OrderedDict
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "size", "capacity"])
+
+
+class LRUCache(object):
+    """Cache holding at most `capacity` entries, evicting the least recently used entry when full."""
+
+    def __init__(self, capacity):
+        """Initialize an empty cache holding at most specified number of entries."""
+        if capacity < 1:
+            raise ValueError("Cache capacity must be positive.")
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the value cached for specified key, or `None` if there is none."""
+        value = self._entries.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Cache specified value for specified key, evicting the least recently used entry if the cache is full."""
+        if key not in self._entries and len(self._entries) >= self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        self._entries[key] = value
+
+    def clear(self):
+        """Remove all entries. Counters are kept."""
+        self._entries.clear()
+
+    def info(self):
+        """Return counters and current size."""
+        return CacheInfo(self.hits, self.misses, self.evictions, len(self._entries), self.capacity)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,450 @@
+# coding: utf-8
+"""
+Compact binary format for lemmatization rules.
+
+A compiled rule file consists of a header, a string table holding every word class, full form suffix and lemma suffix
+exactly once, and a block per word class containing an open addressing hash table over the full form suffixes of that
+class and the distinct lengths of those suffixes. Files are opened using `mmap` and queried in place, so no rule
+objects are created until a rule is looked up.
+
+The data following the header may optionally be compressed using zlib or lzma, in which case it is decompressed into
+memory when loaded. The header holds a CRC-32 checksum of the uncompressed data.
+"""
+# pylint: disable=protected-access
+import importlib
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+try:
+    import lzma
+except ImportError:  # Python 2
+    lzma = None
+
+_replace = getattr(os, "replace", os.rename)  # pylint: disable=invalid-name
+
+# The umask can only be read by setting it, so it is read once on import rather than when other threads may be
+# creating files. Saved files get the permissions of files created using `open`.
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+MAGIC = b"LMRY"
+VERSION = 2
+COMPRESSIONS = (None, "zlib", "lzma")
+
+_HEADER = struct.Struct("<4sHHIII")  # magic, version, compression, checksum, string count, word class count
+# name, slots offset, slot count, entries offset, entry count, rules offset, suffix lengths offset, suffix length count
+_CLASS = struct.Struct("<IIIIIIII")
+_ENTRY = struct.Struct("<IIII")  # suffix hash, suffix, first rule, rule count
+_UINT = struct.Struct("<I")
+_SPAN = struct.Struct("<II")
+_LOCKED = 0x80000000
+
+
+class _BufferTable(object):
+    """
+    Base class of tables backed by a buffer (bytes or a memory mapped file) starting with a header.
+
+    Subclasses set `_buffer`, `path`, `checksum` and the offsets of their string table: `_strings_offset` (start
+    offsets), `_blob_offset` (UTF-8 encoded strings) and `_string_count`.
+    """
+
+    _HEADER_SIZE = None
+    _DESCRIPTION = None
+
+    path = None
+    checksum = None
+    _buffer = b""
+    _strings_offset = 0
+    _blob_offset = 0
+    _string_count = 0
+
+    def __reduce__(self):
+        # Memory mapped tables are pickled by reference, so unpickling maps the same file instead of copying it.
+        if self.path is not None:
+            return _open, (type(self), self.path) + self._pickle_args()
+        return type(self), (self.to_bytes(),) + self._pickle_args()
+
+    def to_bytes(self):
+        """Return the table in its file format."""
+        return self._buffer[:]
+
+    def save(self, path):
+        """Write the table to specified file, copying the buffer as it is."""
+        write_atomic(path, self.to_bytes())
+
+    def _pickle_args(self):
+        """Return the arguments following the buffer or path needed to create a copy of the table."""
+        return ()
+
+    def verify(self):
+        """Raise `ValueError` if the data does not match the checksum stored in the header."""
+        if _checksum(self._buffer, self._HEADER_SIZE) != self.checksum:
+            raise ValueError("%s is corrupt: checksum mismatch." % self._DESCRIPTION)
+
+    def _string(self, string_id):
+        start, end = _SPAN.unpack_from(self._buffer, self._strings_offset + string_id * _UINT.size)
+        return self._buffer[self._blob_offset + start:self._blob_offset + end].decode("utf-8")
+
+    def _string_decoder(self):
+        """Return a function decoding strings by id, faster than `_string` when decoding many strings."""
+        offsets = struct.unpack_from("<%dI" % (self._string_count + 1), self._buffer, self._strings_offset)
+        blob = self._buffer[self._blob_offset:self._blob_offset + offsets[-1]]
+        return lambda string_id: blob[offsets[string_id]:offsets[string_id + 1]].decode("utf-8")
+
+    def _string_equals(self, string_id, encoded):
+        start, end = _SPAN.unpack_from(self._buffer, self._strings_offset + string_id * _UINT.size)
+        return self._buffer[self._blob_offset + start:self._blob_offset + end] == encoded
+
+
+class CompiledRules(_BufferTable, Mapping):
+    """
+    Read-only mapping from word class to compiled rules for that word class.
+
+    Behaves like the nested dictionaries produced by `Lemmatizer.fit`, so it can be passed directly to `Lemmatizer`.
+    If `materialize` is true, the rules for a word class are decoded into a dictionary the first time the word class
+    is looked up. This makes lookups faster while only spending memory on the word classes actually in use.
+    """
+
+    _HEADER_SIZE = _HEADER.size
+    _DESCRIPTION = "Rule file"
+
+    def __init__(self, buffer, materialize=False, path=None):
+        """Initialize compiled rules backed by specified buffer (bytes or mmap of specified file)."""
+        _magic, _version, compression, checksum, string_count, class_count = _read_header(buffer)
+        if compression:
+            raise ValueError("Compressed rule data must be loaded using `loads`.")
+
+        self.path = path
+        self._buffer = buffer
+        self.checksum = checksum
+        self.materialize = materialize
+        self._string_count = string_count
+        self._strings_offset = _HEADER.size
+        classes_offset = self._strings_offset + (string_count + 1) * _UINT.size
+        self._blob_offset = classes_offset + class_count * _CLASS.size
+
+        self._classes = {}
+        for index in range(class_count):
+            header = _CLASS.unpack_from(buffer, classes_offset + index * _CLASS.size)
+            self._classes[self._string(header[0])] = header
+        self._views = {}
+
+    @classmethod
+    def open(cls, path, materialize=False):
+        """Open compiled rules from specified file using a read-only memory map, or decompress them if compressed."""
+        buffer = map_file(path)
+        if _read_header(buffer)[2]:
+            data = buffer[:]
+            buffer.close()
+            return loads(data, materialize)
+        return cls(buffer, materialize, path)
+
+    def _pickle_args(self):
+        return (self.materialize,)
+
+    def __getitem__(self, word_class):
+        view = self._views.get(word_class)
+        if view is None:
+            view = CompiledWordClassRules(self, self._classes[word_class])
+            if self.materialize:
+                view = view.to_dict()
+            self._views[word_class] = view
+        return view
+
+    def __contains__(self, word_class):
+        return word_class in self._classes
+
+    def __iter__(self):
+        return iter(self._classes)
+
+    def __len__(self):
+        return len(self._classes)
+
+
+class CompiledWordClassRules(Mapping):
+    """Read-only mapping from full form suffix to a list of `(lemma_suffix, locked)` rules for one word class."""
+
+    def __init__(self, compiled, header):
+        """Initialize a view of the word class block described by specified class header."""
+        self._compiled = compiled
+        self._buffer = compiled._buffer
+        _name, self._slots_offset, slot_count, self._entries_offset, self._entry_count, self._rules_offset, \
+            self._lengths_offset, self._length_count = header
+        self._mask = slot_count - 1
+
+    def get(self, key, default=None):
+        """Return the rules for specified full form suffix or `default` if there are none."""
+        entry = self._find(key)
+        if entry is None:
+            return default
+        return self._rules(entry)
+
+    def __getitem__(self, key):
+        entry = self._find(key)
+        if entry is None:
+            raise KeyError(key)
+        return self._rules(entry)
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __iter__(self):
+        for entry in self._entries():
+            yield self._compiled._string(entry[1])
+
+    def __len__(self):
+        return self._entry_count
+
+    def suffix_lengths(self):
+        """Return the distinct lengths (in characters) of the full form suffixes of the word class, ascending."""
+        return struct.unpack_from("<%dI" % self._length_count, self._buffer, self._lengths_offset)
+
+    def to_dict(self, locked_only=False):
+        """Return the rules for the word class as a dictionary, optionally only the locked (whole word) rules."""
+        if not self._entry_count:
+            return {}
+        string = self._compiled._string_decoder()
+        fields = struct.unpack_from("<%dI" % (4 * self._entry_count), self._buffer, self._entries_offset)
+        rule_count = fields[-2] + fields[-1]
+        values = struct.unpack_from("<%dI" % rule_count, self._buffer, self._rules_offset)
+        entry_indices = range(0, len(fields), 4)
+        if locked_only:
+            entry_indices = [index for index in entry_indices if values[fields[index + 2]] & _LOCKED]
+
+        unique_rules = {value: (string(value & ~_LOCKED), bool(value & _LOCKED)) for value in set(values)}
+        rules = [unique_rules[value] for value in values]
+        return {string(fields[index + 1]): rules[fields[index + 2]:fields[index + 2] + fields[index + 3]]
+                for index in entry_indices}
+
+    def _entries(self):
+        for index in range(self._entry_count):
+            yield _ENTRY.unpack_from(self._buffer, self._entries_offset + index * _ENTRY.size)
+
+    def _find(self, key):
+        encoded = key.encode("utf-8")
+        hash_ = _hash(encoded)
+        slot = hash_ & self._mask
+        while True:
+            entry_index = _UINT.unpack_from(self._buffer, self._slots_offset + slot * _UINT.size)[0]
+            if entry_index == 0:
+                return None
+            entry = _ENTRY.unpack_from(self._buffer, self._entries_offset + (entry_index - 1) * _ENTRY.size)
+            if entry[0] == hash_ and self._compiled._string_equals(entry[1], encoded):
+                return entry
+            slot = (slot + 1) & self._mask
+
+    def _rules(self, entry):
+        _hash_, _suffix, first_rule, rule_count = entry
+        rules = []
+        for index in range(first_rule, first_rule + rule_count):
+            value = _UINT.unpack_from(self._buffer, self._rules_offset + index * _UINT.size)[0]
+            rules.append((self._compiled._string(value & ~_LOCKED), bool(value & _LOCKED)))
+        return rules
+
+
+def dumps(rules, compression=None):
+    """
+    Compile specified rules (a mapping from word class to full form suffix to rules) and return them as bytes.
+
+    Compression can be None, "zlib" or "lzma". Compressed rules load slower, since they cannot be memory mapped.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError("Unknown compression: %s." % compression)
+    if compression == "lzma" and lzma is None:
+        raise ValueError("lzma compression is not available.")
+
+    strings = _StringTable()
+    word_classes = sorted(rules)
+    class_names = [strings.add(word_class) for word_class in word_classes]
+    blocks = [_compile_word_class(rules[word_class], strings) for word_class in word_classes]
+
+    offsets, blob = strings.encode()
+    blob_offset = _HEADER.size + len(offsets) * _UINT.size + len(word_classes) * _CLASS.size
+    block_offset = blob_offset + len(blob)
+
+    class_headers = []
+    for name, (slots, entries, rule_values, suffix_lengths) in zip(class_names, blocks):
+        slots_offset = block_offset
+        entries_offset = slots_offset + len(slots) * _UINT.size
+        rules_offset = entries_offset + len(entries) * _ENTRY.size
+        lengths_offset = rules_offset + len(rule_values) * _UINT.size
+        block_offset = lengths_offset + len(suffix_lengths) * _UINT.size
+        class_headers.append((name, slots_offset, len(slots), entries_offset, len(entries), rules_offset,
+                              lengths_offset, len(suffix_lengths)))
+
+    parts = [struct.pack("<%dI" % len(offsets), *offsets)]
+    parts += [_CLASS.pack(*header) for header in class_headers]
+    parts.append(blob)
+    for slots, entries, rule_values, suffix_lengths in blocks:
+        parts.append(struct.pack("<%dI" % len(slots), *slots))
+        parts += [_ENTRY.pack(*entry) for entry in entries]
+        parts.append(struct.pack("<%dI" % len(rule_values), *rule_values))
+        parts.append(struct.pack("<%dI" % len(suffix_lengths), *suffix_lengths))
+    body = b"".join(parts)
+
+    checksum = zlib.crc32(body) & 0xffffffff
+    if compression == "zlib":
+        body = zlib.compress(body, 9)
+    elif compression == "lzma":
+        body = lzma.compress(body)
+    header = _HEADER.pack(MAGIC, VERSION, COMPRESSIONS.index(compression), checksum, len(offsets) - 1,
+                          len(word_classes))
+    return header + body
+
+
+def dump(rules, path, compression=None):
+    """
+    Compile specified rules and write them to specified file.
+
+    The rules are compiled before the file is touched and the file is replaced atomically, so rules memory mapped from
+    the file itself (in this or other processes) can be saved over it.
+    """
+    write_atomic(path, dumps(rules, compression))
+
+
+def map_file(path):
+    """Return a read-only memory map of specified file."""
+    with open(path, "rb") as file_:
+        return mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def write_atomic(path, data):
+    """Write specified bytes to a temporary file next to specified file and move it into place."""
+    directory, name = os.path.split(os.path.abspath(path))
+    file_descriptor, temporary_path = tempfile.mkstemp(prefix="." + name + "-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(file_descriptor, "wb") as file_:
+            file_.write(data)
+        os.chmod(temporary_path, 0o666 & ~_UMASK)
+        _replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def shared_memory_file():
+    """Create an empty temporary file for rules, preferably in shared memory, and return its path."""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    file_descriptor, path = tempfile.mkstemp(prefix="lemmy-", suffix=".bin", dir=directory)
+    os.close(file_descriptor)
+    return path
+
+
+def loads(data, materialize=False):
+    """Return compiled rules backed by specified bytes, decompressing and verifying them if compressed."""
+    magic, version, compression, checksum, string_count, class_count = _read_header(data)
+    if not compression:
+        return CompiledRules(data, materialize)
+
+    if COMPRESSIONS[compression] == "zlib":
+        body = zlib.decompress(data[_HEADER.size:])
+    elif lzma is not None:
+        body = lzma.decompress(data[_HEADER.size:])
+    else:
+        raise ValueError("lzma compression is not available.")
+    compiled = CompiledRules(_HEADER.pack(magic, version, 0, checksum, string_count, class_count) + body, materialize)
+    compiled.verify()
+    return compiled
+
+
+def compile_language(language):
+    """Compile the rule module shipping with Lemmy for specified language into a rule file next to it."""
+    module = importlib.import_module("lemmy.rules." + language)
+    path = os.path.splitext(module.__file__)[0] + ".bin"
+    dump(module.rules, path)
+    return path
+
+
+def _compile_word_class(word_class_rules, strings):
+    suffixes = sorted(suffix for suffix, rules_list in word_class_rules.items() if rules_list)
+    entries = []
+    rule_values = []
+    for suffix in suffixes:
+        hash_ = _hash(suffix.encode("utf-8"))
+        entries.append((hash_, strings.add(suffix), len(rule_values), len(word_class_rules[suffix])))
+        for lemma_suffix, locked in word_class_rules[suffix]:
+            rule_values.append(strings.add(lemma_suffix) | (_LOCKED if locked else 0))
+    suffix_lengths = sorted(set(len(suffix) for suffix in suffixes))
+    return _hash_slots([entry[0] for entry in entries]), entries, rule_values, suffix_lengths
+
+
+def _hash_slots(hashes):
+    """
+    Return the slots of an open addressing hash table over entries with specified hashes.
+
+    The number of slots is the smallest power of two at least twice the number of entries. Each slot holds the index
+    of an entry plus one, or 0 if empty, and collisions are resolved by linear probing.
+    """
+    slot_count = 1
+    while slot_count < 2 * len(hashes):
+        slot_count *= 2
+    mask = slot_count - 1
+
+    slots = [0] * slot_count
+    for entry_index, hash_ in enumerate(hashes):
+        slot = hash_ & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = entry_index + 1
+    return slots
+
+
+def _open(cls, path, *args):
+    return cls.open(path, *args)
+
+
+def _read_header(buffer):
+    if len(buffer) < _HEADER.size:
+        raise ValueError("Not a compiled Lemmy rule file.")
+    header = _HEADER.unpack_from(buffer, 0)
+    magic, version, compression = header[:3]
+    if magic != MAGIC:
+        raise ValueError("Not a compiled Lemmy rule file.")
+    if version != VERSION:
+        raise ValueError("Unsupported rule file version: %s." % version)
+    if compression >= len(COMPRESSIONS):
+        raise ValueError("Unknown compression: %s." % compression)
+    return header
+
+
+def _hash(encoded):
+    return zlib.crc32(encoded) & 0xffffffff
+
+
+def _checksum(buffer, header_size):
+    return zlib.crc32(buffer[header_size:]) & 0xffffffff
+
+
+class _StringTable(object):
+    """Collects unique strings and encodes them as an offset array and a UTF-8 blob."""
+
+    def __init__(self):
+        self._ids = {}
+        self._strings = []
+
+    def add(self, string):
+        """Add specified string if not already present and return its id."""
+        string_id = self._ids.get(string)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._ids[string] = string_id
+            self._strings.append(string)
+        return string_id
+
+    def encode(self):
+        """Return a list of start offsets (plus a final end offset) and the concatenated UTF-8 encoded strings."""
+        offsets = [0]
+        parts = []
+        for string in self._strings:
+            encoded = string.encode("utf-8")
+            parts.append(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+        return offsets, b"".join(parts)
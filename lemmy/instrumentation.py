@@ -0,0 +1,66 @@
+# coding: utf-8
+"""Counters describing how a lemmatizer finds and applies its rules."""
+from collections import Counter, defaultdict
+
+
+class Instrumentation(object):
+    """
+    Counters updated by a `Lemmatizer` for every word it lemmatizes without hitting its cache.
+
+    The probe depth of a lookup is the number of suffixes, from the whole full form down to the matching suffix, that
+    a suffix-by-suffix search considers.
+    """
+
+    def __init__(self):
+        """Initialize all counters to zero."""
+        self.reset()
+
+    def reset(self):
+        """Reset all counters to zero."""
+        self.lemmatizations = 0
+        self.ambiguous = 0
+        self.history_used = 0
+        self.history_missing = 0
+        self.no_rule = 0
+        self.lookups = Counter()
+        self.probe_depths = Counter()
+        self.rule_hits = defaultdict(Counter)
+
+    def record_lookup(self, word_class, full_form, match):
+        """Record that specified `(offset, lemma_suffixes)` rule match was found for specified full form and class."""
+        offset, _lemma_suffixes = match
+        self.lookups[word_class] += 1
+        if offset is not None:
+            self.probe_depths[offset + 1] += 1
+            self.rule_hits[word_class][full_form[offset:]] += 1
+        else:
+            self.probe_depths[len(full_form) + 1] += 1
+            self.no_rule += 1
+
+    def record_result(self, lemmas):
+        """Record the lemmas returned for a word."""
+        self.lemmatizations += 1
+        if len(lemmas) > 1:
+            self.ambiguous += 1
+
+    def snapshot(self):
+        """Return the current counters as a dictionary of plain values, ready to be scraped or serialized."""
+        return {
+            "lemmatizations": self.lemmatizations,
+            "ambiguous": self.ambiguous,
+            "ambiguity_rate": self.ambiguous / float(self.lemmatizations) if self.lemmatizations else 0.0,
+            "history_used": self.history_used,
+            "history_missing": self.history_missing,
+            "no_rule": self.no_rule,
+            "lookups": dict(self.lookups),
+            "probe_depths": dict(self.probe_depths),
+            "rule_hits": {word_class: dict(hits) for word_class, hits in self.rule_hits.items()},
+        }
+
+    def most_common_rules(self, count=None):
+        """Return the `count` most often used rules as `((word_class, full_form_suffix), hits)` pairs."""
+        hits = Counter()
+        for word_class, word_class_hits in self.rule_hits.items():
+            for full_form_suffix, rule_hits in word_class_hits.items():
+                hits[(word_class, full_form_suffix)] = rule_hits
+        return hits.most_common(count)
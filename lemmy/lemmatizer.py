@@ -1,21 +1,165 @@
 # coding: utf-8
 """Functions for lemmatizing using a set of lemmatization rules."""
-from collections import defaultdict
+from bisect import bisect_right
+from collections import defaultdict, OrderedDict
+import functools
+import heapq
 import logging
+import multiprocessing
+import os
 import time
 
+from lemmy.cache import LRUCache
+from lemmy import compiled, lookup
+from lemmy.compiled import CompiledRules, CompiledWordClassRules
+from lemmy.instrumentation import Instrumentation
+from lemmy.trie import _NO_MATCH, SuffixTrie
+
+ENGINES = ("dict", "trie")
+
 
 class Lemmatizer(object):  # pylint: disable=too-few-public-methods
     """Class for lemmatizing words. Inspired by the CST lemmatizer."""
 
-    def __init__(self, rules=None):
-        """Initialize a lemmatizer using specified set of rules."""
+    def __init__(self, rules=None, engine="dict", cache_size=0, instrument=False):
+        """
+        Initialize a lemmatizer using specified set of rules.
+
+        The engine determines how the longest matching rule is found: "dict" looks up every suffix of the full form in
+        the rules, while "trie" walks a trie of reversed suffixes once from the end of the full form. If `cache_size`
+        is positive, the lemmas of up to that many recently lemmatized words are cached. If `instrument` is true,
+        lookups are counted in `instrumentation`; it can also be enabled later by assigning an `Instrumentation`.
+        """
+        if engine not in ENGINES:
+            raise ValueError("Unknown engine: %s." % engine)
+        self.engine = engine
+        self.instrumentation = Instrumentation() if instrument else None
+        self._cache = LRUCache(cache_size) if cache_size else None
         self.rules = rules
 
+    @property
+    def rules(self):
+        """Rules used for lemmatizing, as a mapping from word class to full form suffix to rules."""
+        return self._rules
+
+    @rules.setter
+    def rules(self, rules):
+        self._rules = rules
+        self._rule_counts = None
+        self._rule_count = 0
+        self._reset_lookups()
+
+    @property
+    def rule_count(self):
+        """Total number of rules."""
+        if self._rule_counts is None:
+            self._recount_rules()
+        return self._rule_count
+
+    @property
+    def rule_counts(self):
+        """Number of rules for each word class."""
+        if self._rule_counts is None:
+            self._recount_rules()
+        return dict(self._rule_counts)
+
+    @classmethod
+    def from_file(cls, path, verify=True, materialize=False, **kwargs):
+        """
+        Load a lemmatizer using rules from specified file, written by `save`.
+
+        Uncompressed rules are memory mapped and queried in place. If `materialize` is true, the rules for a word class
+        are instead decoded into a dictionary the first time the word class is used. Further keyword arguments are
+        passed on to the constructor.
+        """
+        rules = CompiledRules.open(path, materialize)
+        if verify:
+            rules.verify()
+        return cls(rules, **kwargs)
+
+    def save(self, path, compression=None):
+        """Save the rules to specified file, optionally compressed using "zlib" or "lzma"."""
+        compiled.dump(self.rules, path, compression)
+
+    def save_lookup_table(self, path, vocabulary):
+        """
+        Lemmatize specified vocabulary of `(pos, full_form)` pairs and save the lemmas to a lookup table file.
+
+        The table can be opened using `lemmy.lookup.LemmaTable.open` and queried without loading any rules.
+        """
+        lookup.dump(self, vocabulary, path)
+
+    def share(self, path=None):
+        """
+        Move the rules to a memory mapped file and return its path.
+
+        Other processes can attach to the rules using `from_file` (or by unpickling this lemmatizer), in which case the
+        operating system shares a single copy of the rules between all processes. If no path is specified, a
+        temporary file is created, preferably in shared memory. The caller is responsible for deleting it.
+        """
+        if path is None:
+            if isinstance(self.rules, CompiledRules) and self.rules.path is not None and not self.rules.materialize:
+                return self.rules.path
+            path = compiled.shared_memory_file()
+        self.save(path)
+        self.rules = CompiledRules.open(path)
+        return path
+
+    def __getstate__(self):
+        # Lookup structures and cached lemmas are rebuilt by `__setstate__`, so only the rules are pickled.
+        state = self.__dict__.copy()
+        state["_trie"] = None
+        state["_whole_words"] = None
+        state["_suffix_lengths"] = {}
+        if self._cache is not None:
+            state["_cache"] = LRUCache(self._cache.capacity)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_lookups()
+
+    def _reset_lookups(self):
+        """Discard lookup structures and cached lemmas derived from the rules."""
+        self._trie = SuffixTrie(self._rules) if self.engine == "trie" and self._rules is not None else None
+        self._suffix_lengths = {}
+
+        # The dict engine finds whole word rules on its first probe, which is a single hash lookup whether the rules
+        # are dictionaries or memory mapped, so only the trie engine benefits from a separate table of them.
+        self._whole_words = _WholeWordRules(self._rules) if self._trie is not None else None
+        if self._cache is not None:
+            self._cache.clear()
+
+    def cache_info(self):
+        """Return hit, miss and eviction counters and size of the lemma cache, or `None` if caching is disabled."""
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
+    def cache_clear(self):
+        """Remove all cached lemmas."""
+        if self._cache is not None:
+            self._cache.clear()
+
     def lemmatize(self, word_class, full_form, pos_previous=None):
         """Return lemma for specified full form word of specified word class."""
-        rule = _longest_matching_rule(self.rules, word_class, full_form)
-        predicted_lemmas = _apply_rule(rule, full_form)
+        if self._cache is None:
+            if self.instrumentation is None:
+                return self._lemmatize(word_class, full_form, pos_previous)
+            return self._lemmatize_instrumented(word_class, full_form, pos_previous)
+
+        key = (word_class, full_form, pos_previous)
+        lemmas = self._cache.get(key)
+        if lemmas is None:
+            if self.instrumentation is None:
+                lemmas = tuple(self._lemmatize(word_class, full_form, pos_previous))
+            else:
+                lemmas = tuple(self._lemmatize_instrumented(word_class, full_form, pos_previous))
+            self._cache.put(key, lemmas)
+        return list(lemmas)
+
+    def _lemmatize(self, word_class, full_form, pos_previous=None):
+        predicted_lemmas = _apply_match(self._longest_matching_rule(word_class, full_form), full_form)
 
         if len(predicted_lemmas) == 1:
             # No ambiguity, just return the prediction.
@@ -30,56 +174,255 @@ class Lemmatizer(object):  # pylint: disable=too-few-public-methods
             return predicted_lemmas
 
         # Lemmatize using history.
-        return self.lemmatize(pos_previous + "_" + word_class, full_form, pos_previous=None)
+        return self._lemmatize(pos_previous + "_" + word_class, full_form, pos_previous=None)
+
+    def _lemmatize_instrumented(self, word_class, full_form, pos_previous=None):
+        """Same as `_lemmatize`, but updating the instrumentation counters."""
+        instrumentation = self.instrumentation
+        match = self._longest_matching_rule(word_class, full_form)
+        instrumentation.record_lookup(word_class, full_form, match)
+        predicted_lemmas = _apply_match(match, full_form)
+
+        if len(predicted_lemmas) > 1 and pos_previous is not None:
+            history_word_class = pos_previous + "_" + word_class
+            if history_word_class in self.rules:
+                instrumentation.history_used += 1
+                match = self._longest_matching_rule(history_word_class, full_form)
+                instrumentation.record_lookup(history_word_class, full_form, match)
+                predicted_lemmas = _apply_match(match, full_form)
+            else:
+                instrumentation.history_missing += 1
+
+        instrumentation.record_result(predicted_lemmas)
+        return predicted_lemmas
+
+    def lemmatize_many(self, word_classes, full_forms=None, pos_previous=None):
+        """
+        Return lemmas for each of specified full form words of specified word classes.
+
+        Word classes, full forms and (optionally) previous word classes can be specified as parallel sequences or, if
+        `full_forms` is left out, as a single iterable of `(word_class, full_form)` or
+        `(word_class, full_form, pos_previous)` tuples. Repeated words are only lemmatized once.
+        """
+        if full_forms is None:
+            tokens = word_classes
+        elif pos_previous is None:
+            tokens = zip(word_classes, full_forms)
+        else:
+            tokens = zip(word_classes, full_forms, pos_previous)
+
+        if self.instrumentation is not None:
+            return [self.lemmatize(*token) for token in tokens]
+
+        lookups = {}
+        known_lemmas = {}
+        all_lemmas = []
+        for token in tokens:
+            predicted_lemmas = known_lemmas.get(token)
+            if predicted_lemmas is None:
+                word_class, full_form = token[0], token[1]
+                lookup = lookups.get(word_class)
+                if lookup is None:
+                    lookup = lookups[word_class] = self._word_class_lookup(word_class)
+                predicted_lemmas = _apply_match(lookup(full_form), full_form)
+                if len(predicted_lemmas) > 1 and len(token) > 2 and token[2] is not None:
+                    # Ambiguous, so let history have a go.
+                    history_word_class = token[2] + "_" + word_class
+                    if history_word_class in self.rules:
+                        lookup = lookups.get(history_word_class)
+                        if lookup is None:
+                            lookup = lookups[history_word_class] = self._word_class_lookup(history_word_class)
+                        predicted_lemmas = _apply_match(lookup(full_form), full_form)
+                known_lemmas[token] = predicted_lemmas
+            all_lemmas.append(list(predicted_lemmas))
+        return all_lemmas
+
+    def lemmatize_sentence(self, tokens):
+        """
+        Return lemmas for each of specified `(word_class, full_form)` pairs making up a sentence.
+
+        The word class of the previous word in the sentence is used to resolve ambiguity, like `pos_previous` of
+        `lemmatize`. The first word has an empty previous word class.
+        """
+        tokens = list(tokens)
+        pos_previous = [""] + [word_class for word_class, _ in tokens[:-1]]
+        return self.lemmatize_many([(word_class, full_form, previous)
+                                    for (word_class, full_form), previous in zip(tokens, pos_previous)])
+
+    def _longest_matching_rule(self, word_class, full_form):
+        """
+        Find the rule with the longest full form suffix matching specified full form and class.
+
+        Return an `(offset, lemma_suffixes)` match, where `offset` is the index at which the suffix starts in the full
+        form, or `(None, ())` if no rule matches.
+        """
+        if self._whole_words is not None:
+            lemma_suffixes = self._whole_words.word_class_rules(word_class).get(full_form)
+            if lemma_suffixes is not None:
+                return 0, lemma_suffixes
+        if self._trie is not None:
+            return self._trie.longest_matching_rule(word_class, full_form)
+        suffix_lengths = self._suffix_lengths.get(word_class)
+        if suffix_lengths is None:
+            if word_class not in self._rules:
+                return _NO_MATCH
+            suffix_lengths = self._word_class_suffix_lengths(word_class)
+        return _longest_indexed_rule(self._rules[word_class], suffix_lengths, full_form)
+
+    def _word_class_lookup(self, word_class):
+        """Return a function finding the longest matching rule for a full form of specified word class."""
+        if self._trie is not None:
+            lookup = self._trie.word_class_lookup(word_class)
+        elif word_class not in self._rules:
+            lookup = _no_matching_rule
+        else:
+            lookup = functools.partial(_longest_indexed_rule, self._rules[word_class],
+                                       self._word_class_suffix_lengths(word_class))
+
+        if self._whole_words is not None:
+            return functools.partial(_whole_word_first, self._whole_words.word_class_rules(word_class), lookup)
+        return lookup
+
+    def _word_class_suffix_lengths(self, word_class):
+        """Return the distinct lengths of the full form suffixes of the rules for specified word class, ascending."""
+        suffix_lengths = self._suffix_lengths.get(word_class)
+        if suffix_lengths is None:
+            word_class_rules = self._rules[word_class]
+            if isinstance(word_class_rules, CompiledWordClassRules):
+                # Stored in the rule file, so no suffixes are decoded.
+                suffix_lengths = word_class_rules.suffix_lengths()
+            else:
+                suffix_lengths = tuple(sorted({len(full_form_suffix) for full_form_suffix in word_class_rules}))
+            self._suffix_lengths[word_class] = suffix_lengths
+        return suffix_lengths
+
+    def fit(self, X, y, max_iteration=20, n_jobs=1, worklist=False):
+        """
+        Train a lemmatizer on specified training data.
+
+        If `n_jobs` is not 1, the training data is partitioned by word class and the rules for each word class are
+        trained in a separate process, using at most `n_jobs` processes (or one per CPU if `n_jobs` is -1). In that
+        case, each word class is trained until its own rules stop changing rather than until all rules stop changing.
+
+        If `worklist` is true, each epoch only revisits the training examples having a suffix whose rules changed
+        since the example was last visited. This yields the same rules, but needs memory for an index of all suffixes
+        of all training examples.
+        """
+        if n_jobs != 1:
+            self._fit_parallel(X, y, max_iteration, n_jobs, worklist)
+            return
 
-    def fit(self, X, y, max_iteration=20):
-        """Train a lemmatizer on specified training data."""
         self.rules = defaultdict(lambda: defaultdict(lambda: []))
+        self._rule_counts = defaultdict(int)
+        pending = _Worklist(X) if worklist else None
         old_rule_count = -1
         epoch = 1
         train_start = time.time()
-        while old_rule_count != self._count_rules() and epoch <= max_iteration:
+        while old_rule_count != self.rule_count and epoch <= max_iteration:
             epoch_start = time.time()
-            old_rule_count = self._count_rules()
-            self._train_epoch(X, y)
-            rule_count = self._count_rules()
+            old_rule_count = self.rule_count
+            if pending is None:
+                self._train_epoch(X, y)
+            else:
+                self._train_worklist_epoch(X, y, pending)
+            rule_count = self.rule_count
             logging.debug("epoch #%s: %s rules (%s new) in %.2fs", epoch, rule_count, rule_count - old_rule_count,
                           time.time() - epoch_start)
             epoch += 1
         logging.debug("training complete: %s rules in %.2fs", rule_count, time.time() - train_start)
         self._prune(X)
+        self._reset_lookups()
 
-    def _count_rules(self):
-        return sum(len(lemmas) for suffix_lookup in self.rules.values() for lemmas in suffix_lookup.values())
+    def _fit_parallel(self, X, y, max_iteration, n_jobs, worklist):
+        shards = OrderedDict()
+        for (word_class, full_form), lemma in zip(X, y):
+            if word_class not in shards:
+                shards[word_class] = ([], [])
+            shards[word_class][0].append((word_class, full_form))
+            shards[word_class][1].append(lemma)
+
+        # Start with the largest shards so they don't end up running alone at the end.
+        tasks = [(X_shard, y_shard, max_iteration, worklist)
+                 for X_shard, y_shard in sorted(shards.values(), key=lambda shard: len(shard[1]), reverse=True)]
+        train_start = time.time()
+        pool = multiprocessing.Pool(None if n_jobs == -1 else n_jobs)
+        try:
+            shard_rules = pool.map(_fit_shard, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        rules = defaultdict(lambda: defaultdict(lambda: []))
+        for word_class_rules in shard_rules:
+            for word_class, suffix_lookup in word_class_rules.items():
+                rules[word_class] = defaultdict(lambda: [], suffix_lookup)
+        self.rules = rules
+        logging.debug("parallel training complete: %s word classes, %s rules in %.2fs", len(shards),
+                      self.rule_count, time.time() - train_start)
+
+    def _recount_rules(self):
+        self._rule_counts = defaultdict(int)
+        for word_class, suffix_lookup in self.rules.items():
+            self._rule_counts[word_class] = sum(len(lemmas) for lemmas in suffix_lookup.values())
+        self._rule_count = sum(self._rule_counts.values())
+
+    def _set_rules(self, word_class, full_form_suffix, rules_list):
+        """Replace the rules for specified full form suffix and word class, keeping the rule counts up to date."""
+        word_class_rules = self.rules[word_class]
+        change = len(rules_list) - len(word_class_rules.get(full_form_suffix, ()))
+        word_class_rules[full_form_suffix] = rules_list
+        self._rule_counts[word_class] += change
+        self._rule_count += change
+
+    def _remove_rules(self, word_class, full_form_suffix):
+        """Remove the rules for specified full form suffix and word class, keeping the rule counts up to date."""
+        change = len(self.rules[word_class].pop(full_form_suffix))
+        self._rule_counts[word_class] -= change
+        self._rule_count -= change
 
     def _train_epoch(self, X, y):
         for (word_class, full_form), lemma in zip(X, y):
-            rule = _longest_matching_rule(self.rules, word_class, full_form)
-            predicted_lemmas = _apply_rule(rule, full_form)
+            self._train_example(word_class, full_form, lemma)
 
-            if len(predicted_lemmas) == 1 and lemma in predicted_lemmas:
-                # Current rules yield the correct lemma, so nothing to do.
-                continue
+    def _train_worklist_epoch(self, X, y, pending):
+        for index in pending.epoch():
+            word_class, full_form = X[index]
+            full_form_suffix = self._train_example(word_class, full_form, y[index])
+            if full_form_suffix is not None:
+                pending.rules_changed(word_class, full_form_suffix)
+
+    def _train_example(self, word_class, full_form, lemma):
+        """Add or update a rule if needed to lemmatize specified example. Return the suffix of changed rules, if any."""
+        rule = _longest_matching_rule(self.rules, word_class, full_form)
+        predicted_lemmas = _apply_rule(rule, full_form)
 
-            # Current rules don't yield the correct lemma, so we will add a new rule. To make sure the new rule will
-            # be used, try to make it at least one character longer than existing longest matching rule.
-            current_rule_length = len(rule[0])
-            full_form_suffix, lemma_suffix, exhausted = _create_rule(full_form, lemma, current_rule_length)
-
-            if exhausted:
-                # New rule exhausts full form, meaning we may or may not have an existing rule with the new full
-                # form suffix.
-                if not self._full_form_suffix_locked(word_class, full_form_suffix):
-                    # Existing rules for the full form suffix (if there are any) are not locked. So we remove them
-                    # and replace them with the new rule.
-                    self.rules[word_class][full_form_suffix] = [(lemma_suffix, True)]
-                elif not self._rule_exists(word_class, full_form_suffix, lemma_suffix):
-                    self.rules[word_class][full_form_suffix] += [(lemma_suffix, True)]
+        if len(predicted_lemmas) == 1 and lemma in predicted_lemmas:
+            # Current rules yield the correct lemma, so nothing to do.
+            return None
+
+        # Current rules don't yield the correct lemma, so we will add a new rule. To make sure the new rule will
+        # be used, try to make it at least one character longer than existing longest matching rule.
+        current_rule_length = len(rule[0])
+        full_form_suffix, lemma_suffix, exhausted = _create_rule(full_form, lemma, current_rule_length)
+
+        if exhausted:
+            # New rule exhausts full form, meaning we may or may not have an existing rule with the new full
+            # form suffix.
+            if not self._full_form_suffix_locked(word_class, full_form_suffix):
+                # Existing rules for the full form suffix (if there are any) are not locked. So we remove them
+                # and replace them with the new rule.
+                self._set_rules(word_class, full_form_suffix, [(lemma_suffix, True)])
+            elif not self._rule_exists(word_class, full_form_suffix, lemma_suffix):
+                self._set_rules(word_class, full_form_suffix,
+                                self.rules[word_class][full_form_suffix] + [(lemma_suffix, True)])
             else:
-                # New rule does not exhaust full form, meaning we are not using the complete full form for suffix.
-                # Therefore it's safe to assume the new rule is longer than previous matching rule, and subsequently
-                # that no rules with the new suffix exist. And so, we don't have to consider existing rules.
-                self.rules[word_class][full_form_suffix] = [(lemma_suffix, False)]
+                return None
+        else:
+            # New rule does not exhaust full form, meaning we are not using the complete full form for suffix.
+            # Therefore it's safe to assume the new rule is longer than previous matching rule, and subsequently
+            # that no rules with the new suffix exist. And so, we don't have to consider existing rules.
+            self._set_rules(word_class, full_form_suffix, [(lemma_suffix, False)])
+        return full_form_suffix
 
     def _full_form_suffix_locked(self, word_class, full_form_suffix):
         rules_list = self.rules[word_class][full_form_suffix]
@@ -94,7 +437,7 @@ class Lemmatizer(object):  # pylint: disable=too-few-public-methods
         return lemma_suffix in (lemma_suffix_ for (lemma_suffix_, _) in rules_list)
 
     def _prune(self, X):
-        pre_prune_count = self._count_rules()
+        pre_prune_count = self.rule_count
         logging.debug("rules before pruning: %s", pre_prune_count)
         used_rules = {}
 
@@ -110,30 +453,129 @@ class Lemmatizer(object):  # pylint: disable=too-few-public-methods
             full_form_suffixes = list(word_class_rules.keys())
             for full_form_suffix in full_form_suffixes:
                 if word_class + "_" + full_form_suffix not in used_rules:
-                    word_class_rules.pop(full_form_suffix)
+                    self._remove_rules(word_class, full_form_suffix)
 
-        post_prune_count = self._count_rules()
+        post_prune_count = self.rule_count
         logging.debug("rules after pruning: %s (%s removed)", post_prune_count, pre_prune_count - post_prune_count)
 
 
-def load(language):
-    """Load lemmatizer for specified language."""
+class _Worklist(object):
+    """
+    Keeps track of which training examples need to be revisited during training.
+
+    An example needs to be revisited only if rules were changed for one of its suffixes since it was last visited.
+    Otherwise, the longest matching rule and thus the outcome of visiting it is the same as last time. Within an
+    epoch, examples are visited in their original order, so that training yields exactly the same rules as visiting
+    every example in every epoch.
+    """
+
+    def __init__(self, X):
+        """Index specified training examples by word class and suffix. Initially, every example is pending."""
+        self._examples = defaultdict(lambda: defaultdict(list))
+        for index, (word_class, full_form) in enumerate(X):
+            word_class_examples = self._examples[word_class]
+            for start_index in range(len(full_form) + 1):
+                word_class_examples[full_form[start_index:]].append(index)
+        self._next = set(range(len(X)))
+        self._current = []
+        self._queued = set()
+        self._position = -1
+
+    def epoch(self):
+        """Yield, in order, the indices of the examples to visit in this epoch."""
+        self._current = sorted(self._next)
+        self._queued = self._next
+        self._next = set()
+        while self._current:
+            self._position = heapq.heappop(self._current)
+            self._queued.discard(self._position)
+            yield self._position
+        self._position = -1
+
+    def rules_changed(self, word_class, full_form_suffix):
+        """Mark the examples of specified word class ending with specified suffix as pending."""
+        for index in self._examples[word_class].get(full_form_suffix, ()):
+            if index <= self._position:
+                # Already visited in this epoch, so revisit in the next.
+                self._next.add(index)
+            elif index not in self._queued:
+                heapq.heappush(self._current, index)
+                self._queued.add(index)
+
+
+class _WholeWordRules(object):  # pylint: disable=too-few-public-methods
+    """
+    Table of the locked rules for each word class, built the first time the word class is looked up.
+
+    Locked rules are created when a rule exhausts the full form of a training example, so their full form suffix is a
+    whole word. If a full form is found in this table, it is thus the longest matching rule.
+    """
+
+    def __init__(self, rules):
+        """Initialize tables for specified rules."""
+        self._rules = rules
+        self._tables = {}
+
+    def word_class_rules(self, word_class):
+        """Return a dictionary of the locked rules for specified word class."""
+        table = self._tables.get(word_class)
+        if table is None:
+            table = self._tables[word_class] = _locked_rules(self._rules.get(word_class, {}))
+        return table
+
+
+def _locked_rules(word_class_rules):
+    if isinstance(word_class_rules, CompiledWordClassRules):
+        return word_class_rules.to_dict(locked_only=True)
+    return {full_form_suffix: rules_list for full_form_suffix, rules_list in word_class_rules.items()
+            if rules_list and rules_list[0][1]}
+
+
+def load(language, materialize=False):
+    """
+    Load lemmatizer for specified language.
+
+    The rules are memory mapped and queried in place. If `materialize` is true, the rules for a word class are instead
+    decoded into a dictionary the first time the word class is used, trading memory for faster lookups.
+    """
     lookup = {'da': _load_da, 'sv': _load_sv}
     if language not in lookup:
         raise ValueError("Language not supported.")
-    return lookup[language]()
+    return lookup[language](materialize)
 
 
-def _load_da():
+def _load_da(materialize):
+    compiled_rules = _load_compiled("da", materialize)
+    if compiled_rules is not None:
+        return Lemmatizer(compiled_rules)
     from lemmy.rules.da import rules as da_rules
     return Lemmatizer(da_rules)
 
 
-def _load_sv():
+def _load_sv(materialize):
+    compiled_rules = _load_compiled("sv", materialize)
+    if compiled_rules is not None:
+        return Lemmatizer(compiled_rules)
     from lemmy.rules.sv import rules as sv_rules
     return Lemmatizer(sv_rules)
 
 
+def _load_compiled(language, materialize):
+    """Memory map the compiled rule file shipping with Lemmy for specified language, if there is one."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules", language + ".bin")
+    if not os.path.exists(path):
+        return None
+    return CompiledRules.open(path, materialize)
+
+
+def _fit_shard(task):
+    """Train a lemmatizer on a shard of the training data and return the rules as plain (picklable) dictionaries."""
+    X, y, max_iteration, worklist = task
+    lemmatizer = Lemmatizer()
+    lemmatizer.fit(X, y, max_iteration, worklist=worklist)
+    return {word_class: dict(suffix_lookup) for word_class, suffix_lookup in lemmatizer.rules.items()}
+
+
 def _create_rule(full_form, lemma, current_rule_length):
     if current_rule_length >= len(full_form) - 1:
         # The current longest matching rule is at least as long as the full form minus one character. Thus, building
@@ -173,21 +615,54 @@ def _max_full_form_prefix_length(full_form, lemma, min_rule_length):
 
 def _longest_matching_rule(rules, word_class, full_form):
     """Find the rule with the longest full form suffix matching specified full form and class."""
-    best = ("", [""])
     if word_class not in rules:
-        return best
+        return "", [""]
+    return _longest_word_class_rule(rules[word_class], full_form)
+
 
+def _longest_word_class_rule(word_class_rules, full_form):
+    """Find the rule with the longest full form suffix matching specified full form among rules for one class."""
+    best = ("", [""])
     start_index = 0
-    word_class_rules = rules[word_class]
     while start_index <= len(full_form):
         temp_suffix = full_form[start_index:]
-        if temp_suffix in word_class_rules:
-            best = temp_suffix, word_class_rules[temp_suffix]
+        lemma_suffixes = word_class_rules.get(temp_suffix)
+        if lemma_suffixes is not None:
+            best = temp_suffix, lemma_suffixes
             break
         start_index += 1
     return best
 
 
+def _longest_indexed_rule(word_class_rules, suffix_lengths, full_form):
+    """
+    Find the rule with the longest full form suffix matching specified full form among rules for one class.
+
+    Only suffixes of the specified lengths (those of the rules, in ascending order) are looked up. Return an
+    `(offset, lemma_suffixes)` match like `Lemmatizer._longest_matching_rule`.
+    """
+    length = len(full_form)
+    index = bisect_right(suffix_lengths, length)
+    while index:
+        index -= 1
+        offset = length - suffix_lengths[index]
+        lemma_suffixes = word_class_rules.get(full_form[offset:])
+        if lemma_suffixes is not None:
+            return offset, lemma_suffixes
+    return _NO_MATCH
+
+
+def _whole_word_first(whole_word_rules, lookup, full_form):
+    lemma_suffixes = whole_word_rules.get(full_form)
+    if lemma_suffixes is not None:
+        return 0, lemma_suffixes
+    return lookup(full_form)
+
+
+def _no_matching_rule(_full_form):
+    return _NO_MATCH
+
+
 def _apply_rule(rule, full_form):
     """
     Apply specified rule to specified full form.
@@ -198,5 +673,16 @@ def _apply_rule(rule, full_form):
     if full_form_suffix == "":
         return [full_form + lemma_suffix for lemma_suffix in lemma_suffixes]
 
-    prefix = full_form.rpartition(full_form_suffix)[0]
+    prefix = full_form[:len(full_form) - len(full_form_suffix)]
+    return [prefix + lemma_suffix for lemma_suffix, _locked in lemma_suffixes]
+
+
+def _apply_match(match, full_form):
+    """Apply the rule of specified `(offset, lemma_suffixes)` match to specified full form."""
+    offset, lemma_suffixes = match
+    if offset is None:
+        return [full_form]
+    prefix = full_form[:offset]
+    if len(lemma_suffixes) == 1:
+        return [prefix + lemma_suffixes[0][0]]
     return [prefix + lemma_suffix for lemma_suffix, _locked in lemma_suffixes]
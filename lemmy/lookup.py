@@ -0,0 +1,145 @@
+# coding: utf-8
+"""
+Precomputed lemma lookup tables for fixed vocabularies.
+
+A lookup table maps each `(pos, full_form)` pair of a vocabulary to the lemmas found by a lemmatizer, so the lemmas of
+known words can be looked up without loading any rules. A table file consists of a header, a string table holding every
+POS tag, full form and lemma exactly once, an open addressing hash table over the vocabulary and an array of lemma ids.
+Files are opened using `mmap` and queried in place.
+"""
+import struct
+import zlib
+
+from lemmy.compiled import _BufferTable, _hash_slots, _StringTable, map_file, write_atomic
+
+MAGIC = b"LMLT"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHIIII")  # magic, version, reserved, checksum, string count, slot count, entry count
+_ENTRY = struct.Struct("<IIIII")  # key hash, pos, full form, first lemma, lemma count
+_UINT = struct.Struct("<I")
+
+
+class LemmaTable(_BufferTable):
+    """Read-only mapping from `(pos, full_form)` pairs to lists of lemmas, backed by a buffer in the table format."""
+
+    _HEADER_SIZE = _HEADER.size
+    _DESCRIPTION = "Lookup table file"
+
+    def __init__(self, buffer, path=None):
+        """Initialize a lookup table backed by specified buffer (bytes or mmap of specified file)."""
+        _magic, _version, _reserved, checksum, string_count, slot_count, entry_count = _read_header(buffer)
+        self.path = path
+        self.checksum = checksum
+        self._buffer = buffer
+        self._mask = slot_count - 1
+        self._entry_count = entry_count
+        self._string_count = string_count
+        self._strings_offset = _HEADER.size
+        self._blob_offset = self._strings_offset + (string_count + 1) * _UINT.size
+        self._slots_offset = self._blob_offset + _UINT.unpack_from(buffer, _HEADER.size + string_count * _UINT.size)[0]
+        self._entries_offset = self._slots_offset + slot_count * _UINT.size
+        self._lemmas_offset = self._entries_offset + entry_count * _ENTRY.size
+
+    @classmethod
+    def open(cls, path):
+        """Open the lookup table in specified file using a read-only memory map."""
+        return cls(map_file(path), path)
+
+    def lookup(self, pos, full_form, default=None):
+        """Return the lemmas of specified full form with specified POS tag, or `default` if not in the vocabulary."""
+        lemma_ids = self.lemma_ids(pos, full_form)
+        if lemma_ids is None:
+            return default
+        return [self.lemma(lemma_id) for lemma_id in lemma_ids]
+
+    def lemma_ids(self, pos, full_form):
+        """Return the ids of the lemmas of specified full form with specified POS tag, or None if not found."""
+        entry = self._find(pos, full_form)
+        if entry is None:
+            return None
+        first_lemma, lemma_count = entry[3], entry[4]
+        return struct.unpack_from("<%dI" % lemma_count, self._buffer, self._lemmas_offset + first_lemma * _UINT.size)
+
+    def lemma(self, lemma_id):
+        """Return the lemma with specified id."""
+        return self._string(lemma_id)
+
+    def __getitem__(self, key):
+        lemmas = self.lookup(*key)
+        if lemmas is None:
+            raise KeyError(key)
+        return lemmas
+
+    def __contains__(self, key):
+        return self._find(*key) is not None
+
+    def __iter__(self):
+        for index in range(self._entry_count):
+            entry = _ENTRY.unpack_from(self._buffer, self._entries_offset + index * _ENTRY.size)
+            yield self._string(entry[1]), self._string(entry[2])
+
+    def __len__(self):
+        return self._entry_count
+
+    def _find(self, pos, full_form):
+        encoded_pos, encoded_full_form = pos.encode("utf-8"), full_form.encode("utf-8")
+        hash_ = _hash(encoded_pos, encoded_full_form)
+        slot = hash_ & self._mask
+        while True:
+            entry_index = _UINT.unpack_from(self._buffer, self._slots_offset + slot * _UINT.size)[0]
+            if entry_index == 0:
+                return None
+            entry = _ENTRY.unpack_from(self._buffer, self._entries_offset + (entry_index - 1) * _ENTRY.size)
+            if entry[0] == hash_ and self._string_equals(entry[2], encoded_full_form) and \
+                    self._string_equals(entry[1], encoded_pos):
+                return entry
+            slot = (slot + 1) & self._mask
+
+
+def dumps(lemmatizer, vocabulary):
+    """Lemmatize specified vocabulary of `(pos, full_form)` pairs and return a lookup table of the lemmas as bytes."""
+    vocabulary = sorted(set((pos, full_form) for pos, full_form in vocabulary))
+    all_lemmas = lemmatizer.lemmatize_many(vocabulary)
+
+    strings = _StringTable()
+    entries = []
+    lemma_ids = []
+    for (pos, full_form), lemmas in zip(vocabulary, all_lemmas):
+        hash_ = _hash(pos.encode("utf-8"), full_form.encode("utf-8"))
+        entries.append((hash_, strings.add(pos), strings.add(full_form), len(lemma_ids), len(lemmas)))
+        lemma_ids += [strings.add(lemma) for lemma in lemmas]
+    slots = _hash_slots([entry[0] for entry in entries])
+
+    offsets, blob = strings.encode()
+    parts = [struct.pack("<%dI" % len(offsets), *offsets), blob, struct.pack("<%dI" % len(slots), *slots)]
+    parts += [_ENTRY.pack(*entry) for entry in entries]
+    parts.append(struct.pack("<%dI" % len(lemma_ids), *lemma_ids))
+    body = b"".join(parts)
+
+    header = _HEADER.pack(MAGIC, VERSION, 0, zlib.crc32(body) & 0xffffffff, len(offsets) - 1, len(slots),
+                          len(entries))
+    return header + body
+
+
+def dump(lemmatizer, vocabulary, path):
+    """Lemmatize specified vocabulary and write a lookup table of the lemmas to specified file."""
+    write_atomic(path, dumps(lemmatizer, vocabulary))
+
+
+def loads(data):
+    """Return a lookup table backed by specified bytes."""
+    return LemmaTable(data)
+
+
+def _read_header(buffer):
+    if len(buffer) < _HEADER.size or _HEADER.unpack_from(buffer, 0)[0] != MAGIC:
+        raise ValueError("Not a Lemmy lookup table file.")
+    header = _HEADER.unpack_from(buffer, 0)
+    if header[1] != VERSION:
+        raise ValueError("Unsupported lookup table file version: %s." % header[1])
+    return header
+
+
+def _hash(encoded_pos, encoded_full_form):
+    return zlib.crc32(encoded_full_form, zlib.crc32(encoded_pos + b"\0")) & 0xffffffff
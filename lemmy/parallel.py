@@ -0,0 +1,130 @@
+# coding: utf-8
+"""
+Lemmatization of large corpora using a pool of processes.
+
+Input is split into chunks which are lemmatized by worker processes, each loading the lemmatizer once when started.
+Results are yielded in input order as soon as they are ready, and only a bounded number of chunks is read ahead, so
+input and output can be streamed.
+"""
+from collections import deque
+import itertools
+import multiprocessing
+
+from lemmy.lemmatizer import Lemmatizer, load
+
+_worker_lemmatizer = None  # pylint: disable=invalid-name
+
+
+class LemmatizerPool(object):
+    """
+    A pool of processes lemmatizing chunks of input.
+
+    The lemmatizer is specified either as a language code, in which case each worker loads the rules shipping with
+    Lemmy, or as a `Lemmatizer`. Lemmatizers with memory mapped rules (see `Lemmatizer.share`) are sent to the workers
+    as a reference to the rule file. If `processes` is 1, everything runs in the current process.
+    """
+
+    def __init__(self, lemmatizer, processes=None, chunk_size=1000, max_pending=None):
+        """Start a pool of specified number of processes (default: one per CPU)."""
+        self.chunk_size = chunk_size
+        self._pool = None
+        self._lemmatizer = None
+        if processes == 1:
+            self._lemmatizer = _load(lemmatizer)
+            self.max_pending = 1
+        else:
+            self._pool = multiprocessing.Pool(processes, _initialize, (lemmatizer,))
+            self.max_pending = max_pending or 2 * (processes or multiprocessing.cpu_count())
+
+    def lemmatize(self, tokens):
+        """Yield the lemmas of each of specified `(pos, full_form)` or `(pos, full_form, pos_previous)` tuples."""
+        for lemmas in self.map_chunks(_lemmatize_tokens, _chunks(tokens, self.chunk_size)):
+            for token_lemmas in lemmas:
+                yield token_lemmas
+
+    def lemmatize_sentences(self, sentences, history=True):
+        """
+        Yield the lemmas of each of specified sentences, given as sequences of `(pos, full_form)` pairs.
+
+        If `history` is true, the POS tag of the previous word of the sentence is used to resolve ambiguity.
+        """
+        for lemmas in self.map_chunks(_lemmatize_sentences, _chunks(sentences, self.chunk_size), history):
+            for sentence_lemmas in lemmas:
+                yield sentence_lemmas
+
+    def map_chunks(self, function, chunks, *args):
+        """
+        Yield `function(lemmatizer, chunk, *args)` for each of specified chunks, in order.
+
+        The function is called in a worker process, with the lemmatizer of that process. It must be defined at module
+        level so it can be pickled.
+        """
+        if self._pool is None:
+            for chunk in chunks:
+                yield function(self._lemmatizer, chunk, *args)
+            return
+
+        pending = deque()
+        for chunk in chunks:
+            pending.append(self._pool.apply_async(_call, (function, chunk, args)))
+            if len(pending) >= self.max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def close(self):
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self._pool is not None:
+            self._pool.terminate()
+        self.close()
+
+
+def lemmatize(tokens, lemmatizer, processes=None, chunk_size=1000):
+    """Yield the lemmas of each of specified `(pos, full_form)` pairs, lemmatized using a pool of processes."""
+    with LemmatizerPool(lemmatizer, processes, chunk_size) as pool:
+        for lemmas in pool.lemmatize(tokens):
+            yield lemmas
+
+
+def lemmatize_sentences(sentences, lemmatizer, processes=None, chunk_size=1000, history=True):
+    """Yield the lemmas of each of specified sentences of `(pos, full_form)` pairs, using a pool of processes."""
+    with LemmatizerPool(lemmatizer, processes, chunk_size) as pool:
+        for lemmas in pool.lemmatize_sentences(sentences, history):
+            yield lemmas
+
+
+def _initialize(lemmatizer):
+    global _worker_lemmatizer  # pylint: disable=global-statement,invalid-name
+    _worker_lemmatizer = _load(lemmatizer)
+
+
+def _load(lemmatizer):
+    return lemmatizer if isinstance(lemmatizer, Lemmatizer) else load(lemmatizer)
+
+
+def _call(function, chunk, args):
+    return function(_worker_lemmatizer, chunk, *args)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    return iter(lambda: list(itertools.islice(iterator, size)), [])
+
+
+def _lemmatize_tokens(lemmatizer, tokens):
+    return lemmatizer.lemmatize_many(tokens)
+
+
+def _lemmatize_sentences(lemmatizer, sentences, history):
+    if history:
+        return [lemmatizer.lemmatize_sentence(sentence) for sentence in sentences]
+    return [lemmatizer.lemmatize_many(sentence) for sentence in sentences]
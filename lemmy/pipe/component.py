@@ -1,9 +1,26 @@
 # coding: utf-8
 """A spaCy pipeline component."""
+import atexit
+import json
+import os
+
+import numpy
+from spacy import util
+from spacy.attrs import LIKE_NUM, LIKE_URL, POS
+from spacy.language import Language
+from spacy.parts_of_speech import IDS as POS_IDS
+from spacy.strings import hash_string
 from spacy.symbols import PRON_LEMMA
 from spacy.tokens import Token
+from spacy.util import minibatch
+
+from lemmy import compiled
+from lemmy.cache import LRUCache
+from lemmy.compiled import CompiledRules
+from lemmy.lemmatizer import Lemmatizer, load as load_lemmatizer
 
-from lemmy.lemmatizer import load as load_lemmatizer
+_PRON_LEMMA_ID = hash_string(PRON_LEMMA)
+_SETTINGS = ("language", "cache_size", "set_lemma", "set_lemmas", "skip_pos", "skip_like_num", "skip_like_url")
 
 
 class LemmyPipelineComponent(object):
@@ -14,14 +31,158 @@ class LemmyPipelineComponent(object):
     """
 
     name = 'lemmy'
+    factory = 'lemmy'
+
+    def __init__(self, language, cache_size=100000, set_lemma=False, set_lemmas=None, lemmatizer=None,
+                 skip_pos=None, skip_like_num=False, skip_like_url=False):  # pylint: disable=too-many-arguments
+        """
+        Initialize a pipeline component instance.
 
-    def __init__(self, language):
-        """Initialize a pipeline component instance."""
-        self._internal = load_lemmatizer(language)
+        The lemmas of up to `cache_size` recently seen words are cached, keyed by the integer ids of their text and POS
+        tag (and the POS tag of the previous word), so repeated words are resolved without decoding any strings.
+
+        If `set_lemma` is true, the first lemma of each word is written to `token.lemma_`, where spaCy stores it
+        natively. All lemmas of ambiguous words are stored as a list in the `token._.lemmas` extension if `set_lemmas`
+        is true, which by default it is unless `set_lemma` is.
+
+        The rules shipping with Lemmy for specified language are used, unless a `lemmatizer` is specified. They are
+        loaded when first needed, so they are never loaded if replaced by rules restored using `from_disk`.
+
+        Tokens with a POS tag in `skip_pos` (e.g. `["PUNCT", "NUM", "SYM", "SPACE"]`), and tokens resembling numbers or
+        URLs if `skip_like_num` or `skip_like_url` is true, are not lemmatized. Their lemma is their text.
+        """
+        self.language = language
+        self._language_rules = lemmatizer is None
+        self._internal = lemmatizer
+        self._shared = None
         self._lemmas = 'lemmas'
+        self._configure(cache_size, set_lemma, set_lemmas, skip_pos, skip_like_num, skip_like_url)
+
+    @property
+    def lemmatizer(self):
+        """The lemmatizer used by the component."""
+        if self._internal is None:
+            self._internal = load_lemmatizer(self.language)
+        return self._internal
+
+    def _configure(self, cache_size, set_lemma, set_lemmas, skip_pos=None, skip_like_num=False,
+                   skip_like_url=False):  # pylint: disable=too-many-arguments
+        self.cache_size = cache_size
+        self._cache = LRUCache(cache_size) if cache_size else None
+        self.set_lemma = set_lemma
+        self.set_lemmas = not set_lemma if set_lemmas is None else set_lemmas
+        self.skip_pos = tuple(skip_pos or ())
+        self.skip_like_num = skip_like_num
+        self.skip_like_url = skip_like_url
+        self._skip_pos_ids = numpy.array([POS_IDS[pos] for pos in self.skip_pos], dtype=numpy.uint64)
+
+        # Add attributes. The extension may already have been added by another instance, e.g. in a worker process.
+        if self.set_lemmas and not Token.has_extension(self._lemmas):
+            Token.set_extension(self._lemmas, default=None)
+
+    def __reduce__(self):
+        # Rules are never pickled along with the component. Memory mapped rules are pickled as a reference to their
+        # file, so worker processes map the same file. Otherwise, the rules of the language are loaded again, or, if
+        # the rules were trained or loaded elsewhere, compiled to a temporary memory mapped file. The file belongs to
+        # this process and is deleted when it exits; the rules used by this component are left as they are.
+        lemmatizer = self._internal
+        if lemmatizer is not None and not _memory_mapped(lemmatizer):
+            lemmatizer = None if self._language_rules else self._shared_lemmatizer()
+        return _restore, (self._cfg(), lemmatizer)
+
+    def _shared_lemmatizer(self):
+        """Return a lemmatizer using a memory mapped copy of the rules, compiled once per set of rules."""
+        lemmatizer = self.lemmatizer
+        if self._shared is None or self._shared[0] is not lemmatizer.rules:
+            path = compiled.shared_memory_file()
+            atexit.register(_remove, path)
+            compiled.dump(lemmatizer.rules, path)
+            self._shared = (lemmatizer.rules, Lemmatizer(CompiledRules.open(path), engine=lemmatizer.engine))
+        return self._shared[1]
+
+    def to_disk(self, path, exclude=tuple(), **kwargs):  # pylint: disable=unused-argument
+        """
+        Save the settings and rules of the component to a directory, rules in the compiled format of `Lemmatizer.save`.
+
+        path (unicode / Path): A path to a directory, which will be created if it doesn't exist.
+        exclude (list): Names of serialization fields to exclude ("cfg" or "rules").
+        """
+        writers = {
+            "cfg": lambda path_: _write_json(path_, self._cfg()),
+            "rules": lambda path_: compiled.write_atomic(str(path_), self._rules_bytes()),
+        }
+        util.to_disk(path, writers, exclude)
+
+    def from_disk(self, path, exclude=tuple(), **kwargs):  # pylint: disable=unused-argument
+        """
+        Load the settings and rules of the component from a directory. Rules are memory mapped, and kept if not saved.
+
+        path (unicode / Path): A path to a directory written by `to_disk`.
+        exclude (list): Names of serialization fields to exclude.
+        RETURNS (LemmyPipelineComponent): The modified component.
+        """
+        readers = {
+            "cfg": lambda path_: self._set_cfg(_read_json(path_)),
+            "rules": self._read_rules,
+        }
+        util.from_disk(path, readers, exclude)
+        return self
+
+    def _read_rules(self, path):
+        # Rules are missing if excluded when saving, in which case the current rules are kept.
+        if path.exists():
+            self._set_lemmatizer(Lemmatizer.from_file(str(path)))
+
+    def to_bytes(self, exclude=tuple(), **kwargs):  # pylint: disable=unused-argument
+        """
+        Serialize the settings and rules of the component to a bytestring.
+
+        exclude (list): Names of serialization fields to exclude.
+        RETURNS (bytes): The serialized component.
+        """
+        getters = {
+            "cfg": self._cfg,
+            "rules": self._rules_bytes,
+        }
+        return util.to_bytes(getters, exclude)
+
+    def from_bytes(self, bytes_data, exclude=tuple(), **kwargs):  # pylint: disable=unused-argument
+        """
+        Load the settings and rules of the component from a bytestring written by `to_bytes`.
+
+        bytes_data (bytes): The data to load from.
+        exclude (list): Names of serialization fields to exclude.
+        RETURNS (LemmyPipelineComponent): The modified component.
+        """
+        setters = {
+            "cfg": self._set_cfg,
+            "rules": lambda data: self._set_lemmatizer(Lemmatizer(compiled.loads(data))),
+        }
+        util.from_bytes(bytes_data, setters, exclude)
+        return self
 
-        # Add attributes
-        Token.set_extension(self._lemmas, default=None)
+    def _rules_bytes(self):
+        # Compiled rules, e.g. memory mapped from a file, are copied as they are instead of being compiled again.
+        rules = self.lemmatizer.rules
+        if isinstance(rules, CompiledRules):
+            return rules.to_bytes()
+        return compiled.dumps(rules)
+
+    def _cfg(self):
+        return {"language": self.language, "cache_size": self.cache_size, "set_lemma": self.set_lemma,
+                "set_lemmas": self.set_lemmas, "skip_pos": list(self.skip_pos), "skip_like_num": self.skip_like_num,
+                "skip_like_url": self.skip_like_url}
+
+    def _set_cfg(self, cfg):
+        cfg = dict(cfg)
+        self.language = cfg.pop("language")
+        self._configure(**cfg)
+
+    def _set_lemmatizer(self, lemmatizer):
+        self._internal = lemmatizer
+        self._language_rules = False
+        if self._cache is not None:
+            self._cache.clear()
 
     def __call__(self, doc):
         """
@@ -30,21 +191,131 @@ class LemmyPipelineComponent(object):
         doc (Doc): The `Doc` returned by the previous pipeline component.
         RETURNS (Doc): The modified `Doc` object.
         """
-        for token in doc:
-            if token.lemma_ == PRON_LEMMA:
-                lemmas = [PRON_LEMMA]
-            else:
-                lemmas = self._get_lemmas(token)
+        self._set_lemmas([doc])
+        return doc
+
+    def pipe(self, docs, batch_size=128, n_threads=-1):  # pylint: disable=unused-argument
+        """
+        Apply the pipeline component to a stream of `Doc` objects.
 
+        Documents are processed in batches, lemmatizing each distinct word of a batch only once.
+
+        docs (iterable): A stream of `Doc` objects.
+        batch_size (int): The number of documents to process at a time.
+        YIELDS (Doc): The modified `Doc` objects, in order.
+        """
+        for batch in minibatch(docs, size=batch_size):
+            self._set_lemmas(batch)
+            for doc in batch:
+                yield doc
+
+    def cache_info(self):
+        """Return hit and miss counts and the size of the cache, or None if caching is disabled."""
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
+    def _set_lemmas(self, docs):
+        # Words are lemmatized one sentence at a time (or one document, if not split into sentences), using the POS
+        # tag of the previous word to resolve ambiguity. All words missing from the cache in a batch go through a
+        # single call, so each distinct word is only lemmatized once.
+        cache = self._cache
+        pron_lemma = _PRON_LEMMA_ID
+        skipping = self.skip_pos or self.skip_like_num or self.skip_like_url
+        resolved = []
+        tokens = []
+        keys = []
+        words = []
+        for doc in docs:
+            skip = self._skip_flags(doc) if skipping else None
+            for sentence in doc.sents if doc.is_sentenced else [doc]:
+                previous = None
+                for token in sentence:
+                    if skip is not None and skip[token.i]:
+                        resolved.append((token, (token.text,)))
+                        previous = token
+                        continue
+                    if token.lemma == pron_lemma:
+                        if self.set_lemmas:
+                            token._.set(self._lemmas, [PRON_LEMMA])
+                        previous = token
+                        continue
+                    if cache is not None:
+                        key = (token.orth, token.pos, previous.pos if previous is not None else 0)
+                        lemmas = cache.get(key)
+                        if lemmas is not None:
+                            resolved.append((token, lemmas))
+                            previous = token
+                            continue
+                        keys.append(key)
+                    tokens.append(token)
+                    words.append((token.pos_, token.text, previous.pos_ if previous is not None else ""))
+                    previous = token
+
+        all_lemmas = self.lemmatizer.lemmatize_many(words)
+        if cache is not None:
+            for key, lemmas in zip(keys, all_lemmas):
+                cache.put(key, tuple(lemmas))
+        resolved.extend(zip(tokens, all_lemmas))
+
+        set_lemma, set_lemmas = self.set_lemma, self.set_lemmas
+        for token, lemmas in resolved:
             if not lemmas:
                 continue
-            token._.set(self._lemmas, lemmas)
-        return doc
+            if set_lemma:
+                token.lemma_ = lemmas[0]
+            if set_lemmas:
+                token._.set(self._lemmas, list(lemmas))
 
-    def _get_lemmas(self, token):
-        lemmas = self._internal.lemmatize(token.pos_, token.text)
-        return lemmas
+    def _skip_flags(self, doc):
+        """Return a list telling for each token of specified document whether it is skipped by the pre-filter."""
+        array = doc.to_array([POS, LIKE_NUM, LIKE_URL])
+        skip = numpy.isin(array[:, 0], self._skip_pos_ids)
+        if self.skip_like_num:
+            skip |= array[:, 1] != 0
+        if self.skip_like_url:
+            skip |= array[:, 2] != 0
+        return skip.tolist()
 
 
 def load(language):
     return LemmyPipelineComponent(language)
+
+
+def create_component(nlp, **cfg):
+    """
+    Return a pipeline component for the language of specified `nlp` object, configured using `cfg`.
+
+    This is the factory registered with spaCy as "lemmy", so the component can be created using `nlp.create_pipe` and
+    is restored by `spacy.load`. Settings not accepted by `LemmyPipelineComponent` (e.g. overrides passed to
+    `spacy.load`) are ignored.
+    """
+    settings = dict((name, value) for name, value in cfg.items() if name in _SETTINGS)
+    settings.setdefault("language", nlp.lang)
+    return LemmyPipelineComponent(**settings)
+
+
+def _memory_mapped(lemmatizer):
+    return isinstance(lemmatizer.rules, CompiledRules) and lemmatizer.rules.path is not None
+
+
+def _write_json(path, data):
+    with util.ensure_path(path).open("wb") as file_:
+        file_.write(json.dumps(data, sort_keys=True).encode("utf-8"))
+
+
+def _read_json(path):
+    with util.ensure_path(path).open("rb") as file_:
+        return json.loads(file_.read().decode("utf-8"))
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _restore(cfg, lemmatizer):
+    return LemmyPipelineComponent(lemmatizer=lemmatizer, **cfg)
+
+
+Language.factories[LemmyPipelineComponent.factory] = create_component
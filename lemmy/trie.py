@@ -0,0 +1,80 @@
+# coding: utf-8
+"""Lookup of longest matching rules using tries of reversed full form suffixes."""
+import functools
+
+_RULE = None  # Key under which a node stores the rules for the suffix it represents. Never clashes with a character.
+_NO_MATCH = (None, ())  # Match returned when no rule matches a full form.
+
+
+class SuffixTrie(object):
+    """
+    Reversed-character tries over the full form suffixes of a set of rules, one trie per word class.
+
+    The trie for a word class is built the first time that word class is looked up.
+    """
+
+    def __init__(self, rules):
+        """Initialize tries for specified rules."""
+        self._rules = rules
+        self._roots = {}
+
+    def longest_matching_rule(self, word_class, full_form):
+        """
+        Find the rule with the longest full form suffix matching specified full form and class.
+
+        Return an `(offset, lemma_suffixes)` match, where `offset` is the index at which the suffix starts in the full
+        form, or `(None, ())` if no rule matches.
+        """
+        root = self._root(word_class)
+        if root is None:
+            return _NO_MATCH
+        return _longest_matching_rule(root, full_form)
+
+    def word_class_lookup(self, word_class):
+        """Return a function finding the longest matching rule for a full form of specified word class."""
+        root = self._root(word_class)
+        if root is None:
+            return _no_matching_rule
+        return functools.partial(_longest_matching_rule, root)
+
+    def _root(self, word_class):
+        root = self._roots.get(word_class)
+        if root is None and word_class in self._rules:
+            root = self._roots[word_class] = _build(self._rules[word_class])
+        return root
+
+
+def _longest_matching_rule(root, full_form):
+    node = root
+    best = node.get(_RULE)
+    best_index = len(full_form)
+    index = len(full_form)
+    while index:
+        index -= 1
+        node = node.get(full_form[index])
+        if node is None:
+            break
+        lemma_suffixes = node.get(_RULE)
+        if lemma_suffixes is not None:
+            best, best_index = lemma_suffixes, index
+
+    if best is None:
+        return _NO_MATCH
+    return best_index, best
+
+
+def _no_matching_rule(_full_form):
+    return _NO_MATCH
+
+
+def _build(word_class_rules):
+    root = {}
+    for full_form_suffix, lemma_suffixes in word_class_rules.items():
+        node = root
+        for character in reversed(full_form_suffix):
+            child = node.get(character)
+            if child is None:
+                child = node[character] = {}
+            node = child
+        node[_RULE] = lemma_suffixes
+    return root
@@ -17,6 +17,7 @@ setup(
     url="https://github.com/sorenlind/lemmy/",
     keywords="nlp lemma lemmatizer lemmatiser danish spacy",
     packages=find_packages(),
+    package_data={'lemmy': ['rules/*.bin']},
     install_requires=[],
     extras_require={
         'notebooks': ['pandas', 'jupyter', 'unicodecsv', 'bs4', 'tqdm', 'regex', 'spacy'],
@@ -26,6 +27,7 @@ setup(
         ],
         'test': ['pytest', 'tox'],
     },
+    entry_points={'spacy_factories': ['lemmy = lemmy.pipe.component:create_component']},
     setup_requires=['pytest-runner'],
     tests_require=['pytest'],
     classifiers=[
@@ -0,0 +1,187 @@
+# coding: utf-8
+"""Tests for the compiled rule format."""
+# pylint: disable=protected-access,too-many-public-methods,no-self-use,too-few-public-methods,redefined-outer-name
+from __future__ import unicode_literals
+
+import multiprocessing
+import os
+import pickle
+
+import pytest
+
+import lemmy
+from lemmy.compiled import CompiledRules, dump, dumps, loads
+
+RULES = {
+    'NOUN': {
+        'er': [('', False)],
+        'erne': [('', False)],
+        'alen': [('alen', True), ('ale', True), ('al', True)],
+        'ænd': [('and', False)],
+    },
+    'VERB': {
+        'sprang': [('springe', True)],
+    },
+    'PRON_NOUN': {},
+}
+
+
+class TestCompiled(object):
+    """Test class for the compiled rule format."""
+
+    def test_round_trip(self):
+        """Test that compiled rules contain exactly the rules they were compiled from."""
+        compiled = loads(dumps(RULES))
+        assert set(compiled) == set(RULES)
+        for word_class, word_class_rules in RULES.items():
+            assert len(compiled[word_class]) == len(word_class_rules)
+            assert set(compiled[word_class]) == set(word_class_rules)
+            for full_form_suffix, rules_list in word_class_rules.items():
+                assert compiled[word_class][full_form_suffix] == rules_list
+
+    def test_suffix_lengths(self):
+        """Test that the distinct suffix lengths of each word class are stored, counting characters."""
+        compiled = loads(dumps(RULES))
+        assert compiled['NOUN'].suffix_lengths() == (2, 3, 4)
+        assert compiled['PRON_NOUN'].suffix_lengths() == ()
+        assert lemmy.Lemmatizer(compiled)._word_class_suffix_lengths('NOUN') == (2, 3, 4)
+
+    def test_missing(self):
+        """Test lookups of word classes and suffixes without rules."""
+        compiled = loads(dumps(RULES))
+        assert 'ADJ' not in compiled
+        assert 'rne' not in compiled['NOUN']
+        assert compiled['NOUN'].get('rne') is None
+        with pytest.raises(KeyError):
+            compiled['NOUN']['rne']  # pylint: disable=pointless-statement
+
+    def test_lemmatize(self, tmpdir):
+        """Test lemmatizing using memory mapped rules."""
+        path = str(tmpdir.join("rules.bin"))
+        dump(RULES, path)
+        lemmatizer = lemmy.Lemmatizer(CompiledRules.open(path))
+        assert lemmatizer.lemmatize('NOUN', 'bilerne') == ['bil']
+        assert lemmatizer.lemmatize('NOUN', 'mænd') == ['mand']
+        assert sorted(lemmatizer.lemmatize('NOUN', 'alen')) == sorted(['alen', 'ale', 'al'])
+        assert lemmatizer.lemmatize('VERB', 'sprang') == ['springe']
+
+    def test_corrupt(self):
+        """Test that checksum verification detects modified rule data."""
+        data = bytearray(dumps(RULES))
+        data[-1] ^= 0xff
+        with pytest.raises(ValueError):
+            loads(bytes(data)).verify()
+
+    def test_shipped_rules(self):
+        """Test that the shipped compiled rules match the shipped Python rules."""
+        from lemmy.rules.sv import rules as sv_rules
+        compiled = lemmy.load("sv").rules
+        assert isinstance(compiled, CompiledRules)
+        compiled.verify()
+        assert set(compiled) == set(sv_rules)
+        for word_class, word_class_rules in sv_rules.items():
+            assert len(compiled[word_class]) == len(word_class_rules)
+            for full_form_suffix, rules_list in word_class_rules.items():
+                assert compiled[word_class][full_form_suffix] == rules_list
+
+    @pytest.mark.parametrize("compression", [None, "zlib", "lzma"])
+    def test_save(self, tmpdir, compression):
+        """Test saving trained rules to a file and loading them."""
+        lemmatizer = lemmy.Lemmatizer()
+        lemmatizer.fit([('noun', 'skaber'), ('noun', 'venskaber'), ('noun', 'alen'), ('noun', 'alen')],
+                       ['skaber', 'venskab', 'alen', 'ale'])
+        path = str(tmpdir.join("rules.bin"))
+        lemmatizer.save(path, compression=compression)
+        loaded = lemmy.Lemmatizer.from_file(path)
+        assert loaded.lemmatize('noun', 'venskaber') == ['venskab']
+        assert sorted(loaded.lemmatize('noun', 'alen')) == ['ale', 'alen']
+        assert {word_class: dict(rules) for word_class, rules in loaded.rules.items()} == \
+            {word_class: dict(rules) for word_class, rules in lemmatizer.rules.items()}
+
+    def test_save_over_mapped_file(self, tmpdir):
+        """Test saving memory mapped rules over the file they were loaded from."""
+        path = str(tmpdir.join("rules.bin"))
+        dump(RULES, path)
+        lemmatizer = lemmy.Lemmatizer.from_file(path)
+        lemmatizer.save(path)
+        assert lemmatizer.share(path) == path
+        assert lemmatizer.lemmatize('NOUN', 'bilerne') == ['bil']
+        assert os.listdir(str(tmpdir)) == ["rules.bin"]
+        assert lemmy.Lemmatizer.from_file(path).lemmatize('VERB', 'sprang') == ['springe']
+
+    def test_save_permissions(self, tmpdir):
+        """Test that saved files get the permissions of files created using `open`."""
+        dump(RULES, str(tmpdir.join("rules.bin")))
+        with open(str(tmpdir.join("plain.bin")), "wb"):
+            pass
+        assert os.stat(str(tmpdir.join("rules.bin"))).st_mode == os.stat(str(tmpdir.join("plain.bin"))).st_mode
+
+    def test_to_bytes(self, tmpdir):
+        """Test that memory mapped rules are copied as they are."""
+        path = str(tmpdir.join("rules.bin"))
+        dump(RULES, path)
+        compiled = CompiledRules.open(path)
+        with open(path, "rb") as file_:
+            assert compiled.to_bytes() == file_.read()
+        compiled.save(str(tmpdir.join("copy.bin")))
+        assert CompiledRules.open(str(tmpdir.join("copy.bin")))['VERB']['sprang'] == [('springe', True)]
+
+    def test_corrupt_compressed(self):
+        """Test that loading compressed rules verifies the checksum."""
+        data = bytearray(dumps(RULES, compression="zlib"))
+        data[8] ^= 0xff
+        with pytest.raises(ValueError):
+            loads(bytes(data))
+
+    def test_not_compiled(self):
+        """Test that loading data which is not compiled rules fails."""
+        with pytest.raises(ValueError):
+            loads(b"rules = {}")
+
+    def test_materialize(self):
+        """Test that materialized word classes are decoded on first use only."""
+        compiled = loads(dumps(RULES), materialize=True)
+        assert not compiled._views
+        lemmatizer = lemmy.Lemmatizer(compiled)
+        assert lemmatizer.lemmatize('NOUN', 'bilerne') == ['bil']
+        assert list(compiled._views) == ['NOUN']
+        assert compiled['NOUN'] == RULES['NOUN']
+
+    def test_share(self):
+        """Test sharing trained rules with other processes through a memory mapped file."""
+        lemmatizer = lemmy.Lemmatizer(engine="trie")
+        lemmatizer.fit([('noun', 'skaber'), ('noun', 'venskaber')], ['skaber', 'venskab'])
+        path = lemmatizer.share()
+        try:
+            assert isinstance(lemmatizer.rules, CompiledRules)
+            assert lemmatizer.share() == path
+
+            pool = multiprocessing.Pool(2)
+            try:
+                lemmas = pool.map(_lemmatize_venskaber, [lemmatizer] * 2)
+            finally:
+                pool.close()
+                pool.join()
+            assert lemmas == [['venskab'], ['venskab']]
+
+            unpickled = pickle.loads(pickle.dumps(lemmatizer))
+            assert unpickled.rules.path == path
+            assert unpickled.lemmatize('noun', 'venskaber') == ['venskab']
+        finally:
+            os.remove(path)
+
+    def test_pickle_size(self):
+        """Test that lookup structures and cached lemmas built by lemmatizing are not pickled."""
+        lemmatizer = lemmy.Lemmatizer(lemmy.load("sv").rules, cache_size=100)
+        size = len(pickle.dumps(lemmatizer))
+        for full_form in ['hundarna', 'är', 'större', 'ord']:
+            for word_class in ['NOUN', 'VERB', 'AUX', 'ADJ']:
+                lemmatizer.lemmatize(word_class, full_form)
+        assert len(pickle.dumps(lemmatizer)) == size
+        unpickled = pickle.loads(pickle.dumps(lemmatizer))
+        assert unpickled.lemmatize('NOUN', 'hundarna') == ['hund']
+        assert unpickled.cache_info().capacity == 100
+
+
+def _lemmatize_venskaber(lemmatizer):
+    return lemmatizer.lemmatize('noun', 'venskaber')
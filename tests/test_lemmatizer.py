@@ -0,0 +1,111 @@
+# coding: utf-8
+"""Tests for the lemmatizer API."""
+# pylint: disable=protected-access,too-many-public-methods,no-self-use,too-few-public-methods,redefined-outer-name
+from __future__ import unicode_literals
+
+import pytest
+
+import lemmy
+
+
+@pytest.fixture(scope="module")
+def lemmatizer(request):
+    return lemmy.load("sv")
+
+
+WORDS = [('NOUN', 'hundarna'), ('VERB', 'sprang'), ('NOUN', 'hundarna'), ('ADJ', 'större'), ('X', 'ord'),
+         ('NOUN', 'banan'), ('PROPN', 'Stockholms')]
+
+
+class TestLemmatizer(object):
+    """Test class for the lemmatizer API."""
+
+    @pytest.mark.parametrize("engine", ["dict", "trie"])
+    def test_lemmatize_many(self, lemmatizer, engine):
+        """Test that batch lemmatization yields the same lemmas as lemmatizing one word at a time."""
+        batch_lemmatizer = lemmy.Lemmatizer(lemmatizer.rules, engine=engine)
+        expected = [lemmatizer.lemmatize(word_class, full_form) for word_class, full_form in WORDS]
+        assert batch_lemmatizer.lemmatize_many(WORDS) == expected
+        assert batch_lemmatizer.lemmatize_many([pos for pos, _ in WORDS], [word for _, word in WORDS]) == expected
+
+    def test_lemmatize_many_history(self, lemmatizer):
+        """Test batch lemmatization using the word class of the previous word."""
+        pos_previous = ['DET', None, 'ADP', 'DET', 'DET', 'DET', 'ADP']
+        expected = [lemmatizer.lemmatize(pos, word, previous) for (pos, word), previous in zip(WORDS, pos_previous)]
+        actual = lemmatizer.lemmatize_many([pos for pos, _ in WORDS], [word for _, word in WORDS], pos_previous)
+        assert actual == expected
+        assert lemmatizer.lemmatize_many([token + (previous,) for token, previous in zip(WORDS, pos_previous)]) == \
+            expected
+
+    def test_lemmatize_many_copies(self, lemmatizer):
+        """Test that repeated words yield distinct lists."""
+        first, second = lemmatizer.lemmatize_many([('NOUN', 'hundarna'), ('NOUN', 'hundarna')])
+        assert first == second
+        assert first is not second
+
+    def test_lemmatize_sentence(self, lemmatizer):
+        """Test that the word class of the previous word in a sentence is used to resolve ambiguity."""
+        sentence = [('NOUN', 'hundarna'), ('VERB', 'är'), ('ADJ', 'större'), ('VERB', 'är'), ('X', 'ord')]
+        expected = [lemmatizer.lemmatize(pos, word, previous)
+                    for (pos, word), previous in zip(sentence, ['', 'NOUN', 'VERB', 'ADJ', 'VERB'])]
+        assert len(lemmatizer.lemmatize('VERB', 'är')) > len(expected[1])
+        assert lemmatizer.lemmatize_sentence(iter(sentence)) == expected
+        assert lemmatizer.lemmatize_sentence([]) == []
+
+    def test_cache(self, lemmatizer):
+        """Test that cached lemmas are reused and the least recently used ones are evicted."""
+        cached_lemmatizer = lemmy.Lemmatizer(lemmatizer.rules, cache_size=2)
+        assert cached_lemmatizer.lemmatize('NOUN', 'hundarna') == ['hund']
+        assert cached_lemmatizer.lemmatize('NOUN', 'hundarna') == ['hund']
+        assert cached_lemmatizer.lemmatize('VERB', 'sprang') == ['springa']
+        assert cached_lemmatizer.lemmatize('NOUN', 'hundarna', 'DET') == ['hund']
+        info = cached_lemmatizer.cache_info()
+        assert (info.hits, info.misses, info.evictions, info.size, info.capacity) == (1, 3, 1, 2, 2)
+
+    def test_cache_invalidation(self):
+        """Test that cached lemmas are discarded when the lemmatizer is trained."""
+        cached_lemmatizer = lemmy.Lemmatizer(cache_size=10)
+        cached_lemmatizer.fit([('noun', 'skaber')], ['skab'])
+        assert cached_lemmatizer.lemmatize('noun', 'skaber') == ['skab']
+        cached_lemmatizer.fit([('noun', 'skaber')], ['skaber'])
+        assert cached_lemmatizer.lemmatize('noun', 'skaber') == ['skaber']
+        assert cached_lemmatizer.cache_info().hits == 0
+
+    def test_cache_disabled(self, lemmatizer):
+        """Test that caching is disabled by default."""
+        assert lemmatizer.cache_info() is None
+
+    def test_suffix_lengths(self):
+        """Test that only suffixes of lengths used by the rules are looked up."""
+        rules = {'NOUN': {'erne': [('', False)], 'e': [('', False)], 'skabet': [('skab', False)]}}
+        indexed = lemmy.Lemmatizer(rules)
+        assert indexed._word_class_suffix_lengths('NOUN') == (1, 4, 6)
+        assert indexed.lemmatize('NOUN', 'vennerne') == ['venn']
+        assert indexed.lemmatize('NOUN', 'venskabet') == ['venskab']
+        assert indexed.lemmatize('NOUN', 'fine') == ['fin']
+        assert indexed.lemmatize('NOUN', 'venskab') == ['venskab']
+        assert indexed.lemmatize('VERB', 'venskab') == ['venskab']
+
+    def test_instrumentation(self, lemmatizer):
+        """Test counting lookups, ambiguity and use of history."""
+        instrumented = lemmy.Lemmatizer(lemmatizer.rules, instrument=True)
+        assert instrumented.lemmatize('NOUN', 'hundarna') == ['hund']
+        assert len(instrumented.lemmatize('AUX', 'är')) == 1
+        assert len(instrumented.lemmatize('VERB', 'är')) == 2
+        instrumented.lemmatize('VERB', 'är', 'NOUN')
+        instrumented.lemmatize('VERB', 'är', 'UNKNOWN')
+        snapshot = instrumented.instrumentation.snapshot()
+        assert snapshot['lemmatizations'] == 5
+        assert snapshot['ambiguous'] == snapshot['lemmatizations'] - 2 - snapshot['history_used']
+        assert snapshot['history_used'] == 1
+        assert snapshot['history_missing'] == 1
+        assert snapshot['lookups'] == {'NOUN': 1, 'AUX': 1, 'VERB': 3, 'NOUN_VERB': 1}
+        assert snapshot['rule_hits']['VERB']['är'] == 3
+        assert sum(snapshot['probe_depths'].values()) == 6
+
+        instrumented.instrumentation.reset()
+        assert instrumented.instrumentation.snapshot()['lemmatizations'] == 0
+
+    def test_instrumentation_disabled(self, lemmatizer):
+        """Test that instrumentation is disabled by default."""
+        assert lemmatizer.instrumentation is None
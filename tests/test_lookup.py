@@ -0,0 +1,74 @@
+# coding: utf-8
+"""Tests for precomputed lemma lookup tables."""
+# pylint: disable=protected-access,too-many-public-methods,no-self-use,too-few-public-methods,redefined-outer-name
+from __future__ import unicode_literals
+
+import pickle
+
+import pytest
+
+import lemmy
+from lemmy import lookup
+from lemmy.lookup import LemmaTable
+
+VOCABULARY = [('NOUN', 'hundarna'), ('VERB', 'sprang'), ('NOUN', 'hundarna'), ('ADJ', 'större'), ('X', 'ord'),
+              ('NOUN', 'banan'), ('PROPN', 'Stockholms'), ('VERB', 'banan')]
+
+
+@pytest.fixture(scope="module")
+def lemmatizer(request):
+    return lemmy.load("sv")
+
+
+class TestLookup(object):
+    """Test class for precomputed lemma lookup tables."""
+
+    def test_lookup(self, lemmatizer, tmpdir):
+        """Test that the table holds the lemmas found by the lemmatizer for each word of the vocabulary."""
+        path = str(tmpdir.join("vocabulary.lmlt"))
+        lemmatizer.save_lookup_table(path, iter(VOCABULARY))
+        table = LemmaTable.open(path)
+        table.verify()
+        assert len(table) == len(set(VOCABULARY))
+        assert sorted(table) == sorted(set(VOCABULARY))
+        for pos, full_form in VOCABULARY:
+            assert (pos, full_form) in table
+            assert table[pos, full_form] == lemmatizer.lemmatize(pos, full_form)
+            assert [table.lemma(lemma_id) for lemma_id in table.lemma_ids(pos, full_form)] == table[pos, full_form]
+
+    def test_missing(self, lemmatizer):
+        """Test looking up words not in the vocabulary."""
+        table = lookup.loads(lookup.dumps(lemmatizer, VOCABULARY))
+        assert table.lookup('ADJ', 'hundarna') is None
+        assert table.lookup('NOUN', 'katterna', ['katt']) == ['katt']
+        assert ('NOUN', 'katterna') not in table
+        with pytest.raises(KeyError):
+            table['NOUN', 'katterna']  # pylint: disable=pointless-statement
+
+    def test_empty(self, lemmatizer):
+        """Test a table of an empty vocabulary."""
+        table = lookup.loads(lookup.dumps(lemmatizer, []))
+        assert len(table) == 0
+        assert table.lookup('NOUN', 'hundarna') is None
+
+    def test_shared_lemmas(self, lemmatizer):
+        """Test that identical lemmas share an id."""
+        table = lookup.loads(lookup.dumps(lemmatizer, [('NOUN', 'hundarna'), ('NOUN', 'hunden')]))
+        assert table.lemma_ids('NOUN', 'hundarna') == table.lemma_ids('NOUN', 'hunden')
+
+    def test_pickle(self, lemmatizer, tmpdir):
+        """Test that memory mapped tables are pickled by reference to the file."""
+        path = str(tmpdir.join("vocabulary.lmlt"))
+        lookup.dump(lemmatizer, VOCABULARY, path)
+        table = pickle.loads(pickle.dumps(LemmaTable.open(path)))
+        assert table.path == path
+        assert table['NOUN', 'hundarna'] == ['hund']
+
+    def test_corrupt(self, lemmatizer):
+        """Test that corrupt tables are detected."""
+        data = lookup.dumps(lemmatizer, VOCABULARY)
+        with pytest.raises(ValueError):
+            lookup.loads(b"LMRY" + data[4:])
+        table = lookup.loads(data[:-1] + b"\xff")
+        with pytest.raises(ValueError):
+            table.verify()
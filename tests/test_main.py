@@ -0,0 +1,52 @@
+# coding: utf-8
+"""Tests for the command line tool."""
+# pylint: disable=protected-access,too-many-public-methods,no-self-use,too-few-public-methods,redefined-outer-name
+from __future__ import unicode_literals
+
+import io
+
+import pytest
+
+from lemmy.__main__ import main
+
+CONLLU = """# text = Hundarna sprang hem.
+1	hundarna	_	NOUN	_	_	2	nsubj	_	_
+2	sprang	_	VERB	_	_	0	root	_	_
+3-4	hem.	_	_	_	_	_	_	_	_
+3	hem	_	ADV	_	_	2	advmod	_	_
+4	.	_	PUNCT	_	_	2	punct	_	_
+
+1	katterna	_	NOUN	_	_	0	root	_	_
+"""
+
+EXPECTED = """# text = Hundarna sprang hem.
+1	hundarna	hund	NOUN	_	_	2	nsubj	_	_
+2	sprang	springa	VERB	_	_	0	root	_	_
+3-4	hem.	_	_	_	_	_	_	_	_
+3	hem	hem	ADV	_	_	2	advmod	_	_
+4	.	.	PUNCT	_	_	2	punct	_	_
+
+1	katterna	katt	NOUN	_	_	0	root	_	_
+
+"""
+
+
+class TestMain(object):
+    """Test class for the command line tool."""
+
+    @pytest.mark.parametrize("workers", ["1", "2"])
+    def test_conllu(self, tmpdir, capfd, workers):
+        """Test filling in lemmas in CoNLL-U files."""
+        path = str(tmpdir.join("input.conllu"))
+        with io.open(path, "w", encoding="utf-8") as file_:
+            file_.write(CONLLU)
+        main(["-l", "sv", "--workers", workers, "--chunk-size", "1", path, path])
+        assert capfd.readouterr()[0] == EXPECTED + EXPECTED
+
+    def test_tsv(self, tmpdir, capfd):
+        """Test appending lemmas to tab separated files."""
+        path = str(tmpdir.join("input.tsv"))
+        with io.open(path, "w", encoding="utf-8") as file_:
+            file_.write("hundarna\tNOUN\nsprang\tVERB\n\nkatterna\tNOUN\n")
+        main(["-l", "sv", "-f", "tsv", "--history", path])
+        assert capfd.readouterr()[0] == "hundarna\tNOUN\thund\nsprang\tVERB\tspringa\n\nkatterna\tNOUN\tkatt\n\n"
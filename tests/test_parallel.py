@@ -0,0 +1,64 @@
+# coding: utf-8
+"""Tests for lemmatization using a pool of processes."""
+# pylint: disable=protected-access,too-many-public-methods,no-self-use,too-few-public-methods,redefined-outer-name
+from __future__ import unicode_literals
+
+import os
+
+import pytest
+
+import lemmy
+from lemmy import parallel
+
+WORDS = [('NOUN', 'hundarna'), ('VERB', 'sprang'), ('NOUN', 'hundarna'), ('ADJ', 'större'), ('X', 'ord'),
+         ('NOUN', 'banan'), ('PROPN', 'Stockholms')]
+
+
+@pytest.fixture(scope="module")
+def lemmatizer(request):
+    return lemmy.load("sv")
+
+
+class TestParallel(object):
+    """Test class for lemmatization using a pool of processes."""
+
+    @pytest.mark.parametrize("processes", [1, 2])
+    def test_lemmatize(self, lemmatizer, processes):
+        """Test that lemmas are yielded in input order."""
+        tokens = WORDS * 20
+        actual = parallel.lemmatize(iter(tokens), "sv", processes=processes, chunk_size=3)
+        assert list(actual) == [lemmatizer.lemmatize(pos, form) for pos, form in tokens]
+
+    @pytest.mark.parametrize("history", [False, True])
+    def test_lemmatize_sentences(self, lemmatizer, history):
+        """Test lemmatizing sentences, optionally using the POS tag of the previous word."""
+        sentences = [WORDS[:3], WORDS[3:], [], WORDS] * 5
+        expected = []
+        for sentence in sentences:
+            pos_previous = [""] + [pos for pos, _ in sentence[:-1]]
+            expected.append([lemmatizer.lemmatize(pos, form, previous if history else None)
+                             for (pos, form), previous in zip(sentence, pos_previous)])
+        actual = parallel.lemmatize_sentences(sentences, "sv", processes=2, chunk_size=2, history=history)
+        assert list(actual) == expected
+
+    def test_shared_lemmatizer(self, lemmatizer):
+        """Test passing a lemmatizer with memory mapped rules to the workers."""
+        shared = lemmy.Lemmatizer(lemmy.load("sv", materialize=True).rules)
+        path = shared.share()
+        assert path != lemmatizer.rules.path
+        try:
+            with parallel.LemmatizerPool(shared, processes=2, chunk_size=2) as pool:
+                assert list(pool.lemmatize(WORDS)) == [lemmatizer.lemmatize(pos, form) for pos, form in WORDS]
+        finally:
+            os.remove(path)
+
+    def test_concurrent_in_process_pools(self):
+        """Test that pools running in the current process each use their own lemmatizer."""
+        first = lemmy.Lemmatizer({'NOUN': {'a': [('A', False)]}})
+        second = lemmy.Lemmatizer({'NOUN': {'a': [('B', False)]}})
+        first_lemmas = parallel.lemmatize([('NOUN', 'xa')] * 3, first, processes=1, chunk_size=1)
+        assert next(first_lemmas) == ['xA']
+        second_lemmas = parallel.lemmatize([('NOUN', 'xa')] * 3, second, processes=1, chunk_size=1)
+        assert next(second_lemmas) == ['xB']
+        assert list(first_lemmas) == [['xA'], ['xA']]
+        assert list(second_lemmas) == [['xB'], ['xB']]
@@ -0,0 +1,241 @@
+# coding: utf-8
+"""Tests for the spaCy pipeline component."""
+# pylint: disable=protected-access,too-many-public-methods,no-self-use,too-few-public-methods,redefined-outer-name
+from __future__ import unicode_literals
+
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+import lemmy
+
+spacy = pytest.importorskip("spacy")  # pylint: disable=invalid-name
+
+from spacy.lang.sv import Swedish  # noqa: E402 pylint: disable=wrong-import-position
+from spacy.tokens import Doc  # noqa: E402 pylint: disable=wrong-import-position
+
+from lemmy.pipe.component import LemmyPipelineComponent  # noqa: E402 pylint: disable=wrong-import-position
+
+WORDS = [('NOUN', 'hundarna'), ('VERB', 'sprang'), ('NOUN', 'hundarna'), ('ADJ', 'större'), ('PUNCT', '.')]
+RULES = {'NOUN': {'a': [('A', False)]}}
+UNTAGGED_RULES = {'': {'a': [('A', False)]}}
+HISTORY_RULES = {'NOUN': {'a': [('A', False), ('B', False)]}, 'DET_NOUN': {'a': [('B', False)]}}
+
+
+@pytest.fixture(scope="module")
+def nlp(request):
+    return Swedish()
+
+
+@pytest.fixture(scope="module")
+def lemmatizer(request):
+    return lemmy.load("sv")
+
+
+def _doc(nlp, words):
+    doc = Doc(nlp.vocab, words=[word for _, word in words])
+    for token, (pos, _) in zip(doc, words):
+        token.pos_ = pos
+    return doc
+
+
+def _lemmas(doc):
+    return [token._.lemmas for token in doc]
+
+
+class TestPipe(object):
+    """Test class for the spaCy pipeline component."""
+
+    def test_call(self, nlp, lemmatizer):
+        """Test that all lemmas of each word are stored in the extension attribute."""
+        doc = LemmyPipelineComponent("sv")(_doc(nlp, WORDS))
+        pos_previous = [""] + [pos for pos, _ in WORDS[:-1]]
+        expected = [lemmatizer.lemmatize(pos, form, previous) for (pos, form), previous in zip(WORDS, pos_previous)]
+        assert _lemmas(doc) == expected
+
+    def test_pipe(self, nlp):
+        """Test that processing a stream of documents gives the same lemmas as processing them one at a time."""
+        sentences = [WORDS, WORDS[1:], WORDS[:2], WORDS] * 3
+        component = LemmyPipelineComponent("sv")
+        expected = [_lemmas(component(_doc(nlp, words))) for words in sentences]
+        docs = LemmyPipelineComponent("sv").pipe((_doc(nlp, words) for words in sentences), batch_size=3)
+        assert [_lemmas(doc) for doc in docs] == expected
+
+    def test_cache(self, nlp):
+        """Test that repeated words are looked up in the cache."""
+        component = LemmyPipelineComponent("sv")
+        component(_doc(nlp, WORDS))
+        assert component.cache_info().hits == 0
+        assert component.cache_info().misses == len(WORDS)
+        component(_doc(nlp, WORDS))
+        assert component.cache_info().hits == len(WORDS)
+        assert LemmyPipelineComponent("sv", cache_size=0).cache_info() is None
+
+    def test_cache_history(self, nlp):
+        """Test that the POS tag of the previous word is part of the cache key."""
+        component = LemmyPipelineComponent("sv", lemmatizer=lemmy.Lemmatizer(HISTORY_RULES))
+        words = [('NOUN', 'xa'), ('DET', 'en'), ('NOUN', 'xa'), ('NOUN', 'xa')]
+        expected = [['xA', 'xB'], ['en'], ['xB'], ['xA', 'xB']]
+        assert _lemmas(component(_doc(nlp, words))) == expected
+        assert component.cache_info().misses == 4
+        assert _lemmas(component(_doc(nlp, words))) == expected
+        assert component.cache_info().hits == 4
+
+    def test_cache_cleared(self, nlp):
+        """Test that lemmas cached using other rules are discarded when rules are loaded."""
+        component = LemmyPipelineComponent("sv")
+        component(_doc(nlp, [('NOUN', 'xa')]))
+        component.from_bytes(LemmyPipelineComponent("sv", lemmatizer=lemmy.Lemmatizer(RULES)).to_bytes())
+        assert component.cache_info().size == 0
+        assert _lemmas(component(_doc(nlp, [('NOUN', 'xa')]))) == [['xA']]
+
+    def test_set_lemma(self, nlp):
+        """Test writing the first lemma to `lemma_`, without the extension attribute unless asked for."""
+        doc = LemmyPipelineComponent("sv", set_lemma=True)(_doc(nlp, WORDS))
+        assert [token.lemma_ for token in doc] == ['hund', 'springa', 'hund', 'stor', '.']
+        assert _lemmas(doc) == [None] * len(WORDS)
+
+        doc = LemmyPipelineComponent("sv", set_lemma=True, set_lemmas=True)(_doc(nlp, WORDS))
+        assert [token.lemma_ for token in doc] == [lemmas[0] for lemmas in _lemmas(doc)]
+
+    def test_set_lemma_ambiguous(self, nlp):
+        """Test that the first lemma of ambiguous words is written to `lemma_`."""
+        component = LemmyPipelineComponent("sv", set_lemma=True, set_lemmas=True,
+                                           lemmatizer=lemmy.Lemmatizer(HISTORY_RULES))
+        doc = component(_doc(nlp, [('NOUN', 'xa'), ('DET', 'en'), ('NOUN', 'xa')]))
+        assert [token.lemma_ for token in doc] == ['xA', 'en', 'xB']
+        assert _lemmas(doc) == [['xA', 'xB'], ['en'], ['xB']]
+
+    def test_set_lemma_serialized(self, nlp):
+        """Test that lemmas written to `lemma_` are kept when spaCy serializes the document."""
+        doc = LemmyPipelineComponent("sv", set_lemma=True)(_doc(nlp, WORDS))
+        restored = Doc(nlp.vocab).from_bytes(doc.to_bytes())
+        assert [token.lemma_ for token in restored] == ['hund', 'springa', 'hund', 'stor', '.']
+
+    def test_pronoun(self, nlp):
+        """Test that the lemma of pronouns lemmatized by spaCy is kept."""
+        doc = _doc(nlp, [('PRON', 'jag'), ('NOUN', 'hundarna')])
+        doc[0].lemma_ = '-PRON-'
+        LemmyPipelineComponent("sv", set_lemma=True, set_lemmas=True)(doc)
+        assert doc[0].lemma_ == '-PRON-'
+        assert _lemmas(doc) == [['-PRON-'], ['hund']]
+
+    def test_skip(self, nlp):
+        """Test that skipped tokens get their text as lemma."""
+        words = [('NOUN', 'hundarna'), ('NUM', 'tolv'), ('NOUN', '12'), ('NOUN', 'www.lemmy.se'), ('PUNCT', '.')]
+        component = LemmyPipelineComponent("sv", skip_pos=['NUM', 'PUNCT'], skip_like_num=True, skip_like_url=True)
+        assert _lemmas(component(_doc(nlp, words))) == [['hund'], ['tolv'], ['12'], ['www.lemmy.se'], ['.']]
+
+    def test_skip_not_lemmatized(self, nlp):
+        """Test that skipped tokens are neither lemmatized nor cached, and are written to `lemma_`."""
+        words = [('PUNCT', '.'), ('NOUN', 'xa'), ('NOUN', '12'), ('SPACE', ' ')]
+        component = LemmyPipelineComponent("sv", set_lemma=True, set_lemmas=True, skip_pos=['PUNCT', 'SPACE'],
+                                           skip_like_num=True, lemmatizer=lemmy.Lemmatizer(RULES))
+        doc = component(_doc(nlp, words))
+        assert [token.lemma_ for token in doc] == ['.', 'xA', '12', ' ']
+        assert component.cache_info().misses == 1
+
+    def test_skip_history(self, nlp):
+        """Test that skipped tokens still count as the previous word of the following token."""
+        component = LemmyPipelineComponent("sv", skip_pos=['DET'], lemmatizer=lemmy.Lemmatizer(HISTORY_RULES))
+        assert _lemmas(component(_doc(nlp, [('DET', 'ea'), ('NOUN', 'xa')]))) == [['ea'], ['xB']]
+
+    def test_skip_serialized(self, nlp):
+        """Test that skip settings are restored with the component."""
+        component = LemmyPipelineComponent("sv", skip_pos=['NUM'], skip_like_url=True)
+        for restored in [LemmyPipelineComponent("sv").from_bytes(component.to_bytes()),
+                         pickle.loads(pickle.dumps(component))]:
+            words = [('NUM', 'tolv'), ('NOUN', 'www.lemmy.se'), ('NOUN', 'hundarna')]
+            assert _lemmas(restored(_doc(nlp, words))) == [['tolv'], ['www.lemmy.se'], ['hund']]
+
+    def test_pickle(self, nlp):
+        """Test that components are restored with their settings and rules by unpickling."""
+        component = LemmyPipelineComponent("sv", set_lemma=True, skip_pos=['PUNCT'])
+        restored = pickle.loads(pickle.dumps(component))
+        assert restored._cfg() == component._cfg()
+        assert [token.lemma_ for token in restored(_doc(nlp, WORDS))] == ['hund', 'springa', 'hund', 'stor', '.']
+
+        component = LemmyPipelineComponent("sv", lemmatizer=lemmy.Lemmatizer(RULES))
+        restored = pickle.loads(pickle.dumps(component))
+        assert isinstance(component.lemmatizer.rules, dict)
+        assert pickle.loads(pickle.dumps(component)).lemmatizer.rules.path == restored.lemmatizer.rules.path
+        assert _lemmas(restored(_doc(nlp, [('NOUN', 'xa')]))) == [['xA']]
+
+    def test_multiprocess(self):
+        """Test processing documents in worker processes using custom rules."""
+        nlp = Swedish()
+        nlp.add_pipe(LemmyPipelineComponent("sv", lemmatizer=lemmy.Lemmatizer(UNTAGGED_RULES)))
+        docs = nlp.pipe(["xa ya", "za"] * 3, n_process=2, batch_size=2)
+        assert [_lemmas(doc) for doc in docs] == [[['xA'], ['yA']], [['zA']]] * 3
+
+    def test_pickle_file_deleted(self):
+        """Test that the rule file created when pickling is deleted when the process exits."""
+        script = ("import pickle, lemmy\n"
+                  "from lemmy.pipe.component import LemmyPipelineComponent\n"
+                  "component = LemmyPipelineComponent('sv', lemmatizer=lemmy.Lemmatizer(%r))\n"
+                  "print(pickle.loads(pickle.dumps(component)).lemmatizer.rules.path)\n" % RULES)
+        output = subprocess.check_output([sys.executable, "-c", script],
+                                         env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        path = output.decode("utf-8").strip()
+        assert path
+        assert not os.path.exists(path)
+
+    def test_disk_round_trip(self, nlp, tmpdir):
+        """Test saving and loading the settings and custom rules of a component."""
+        component = LemmyPipelineComponent("sv", cache_size=10, lemmatizer=lemmy.Lemmatizer(RULES))
+        component.to_disk(str(tmpdir))
+        restored = LemmyPipelineComponent("da").from_disk(str(tmpdir))
+        assert restored._cfg() == component._cfg()
+        assert restored.lemmatizer.rules.path is not None
+        assert _lemmas(restored(_doc(nlp, [('NOUN', 'xa')]))) == [['xA']]
+
+        restored.to_disk(str(tmpdir.join("copy")))
+        assert tmpdir.join("copy", "rules").read_binary() == tmpdir.join("rules").read_binary()
+
+    def test_bytes_round_trip(self, nlp):
+        """Test serializing and deserializing the settings and custom rules of a component."""
+        component = LemmyPipelineComponent("sv", set_lemma=True, lemmatizer=lemmy.Lemmatizer(RULES))
+        restored = LemmyPipelineComponent("da").from_bytes(component.to_bytes())
+        assert restored._cfg() == component._cfg()
+        assert [token.lemma_ for token in restored(_doc(nlp, [('NOUN', 'xa')]))] == ['xA']
+        assert restored.to_bytes() == component.to_bytes()
+
+    def test_shipped_rules_copied(self, tmpdir):
+        """Test that memory mapped rules are saved and serialized exactly as in their file."""
+        component = LemmyPipelineComponent("sv")
+        with open(component.lemmatizer.rules.path, "rb") as file_:
+            data = file_.read()
+        component.to_disk(str(tmpdir))
+        assert tmpdir.join("rules").read_binary() == data
+        assert LemmyPipelineComponent("sv").from_disk(str(tmpdir)).lemmatizer.lemmatize('NOUN', 'hundarna') == ['hund']
+        restored = LemmyPipelineComponent("da").from_bytes(component.to_bytes())
+        assert restored.lemmatizer.lemmatize('NOUN', 'hundarna') == ['hund']
+
+    def test_exclude_rules(self, tmpdir):
+        """Test that excluded rules are neither saved nor loaded."""
+        component = LemmyPipelineComponent("sv", set_lemma=True, lemmatizer=lemmy.Lemmatizer(RULES))
+        component.to_disk(str(tmpdir), exclude=["rules"])
+        assert not tmpdir.join("rules").exists()
+        restored = LemmyPipelineComponent("da").from_disk(str(tmpdir))
+        assert restored.set_lemma
+        assert restored.lemmatizer.lemmatize('NOUN', 'hundarna') == ['hund']
+
+    def test_model_round_trip(self, tmpdir):
+        """Test that models saved with the component are loaded by `spacy.load` using the factory."""
+        nlp = Swedish()
+        nlp.add_pipe(nlp.create_pipe("lemmy", config={"set_lemma": True}))
+        nlp.get_pipe("lemmy")._set_lemmatizer(lemmy.Lemmatizer(RULES))
+        nlp.to_disk(str(tmpdir))
+        restored = spacy.load(str(tmpdir)).get_pipe("lemmy")
+        assert restored._cfg() == nlp.get_pipe("lemmy")._cfg()
+        assert restored.lemmatizer.rules.path == str(tmpdir.join("lemmy", "rules"))
+
+    def test_factory(self, nlp):
+        """Test creating the component by name, using the language of the model."""
+        component = nlp.create_pipe("lemmy", config={"set_lemma": True, "disable": []})
+        assert isinstance(component, LemmyPipelineComponent)
+        assert component.language == "sv"
+        assert component.set_lemma
@@ -57,3 +57,44 @@ class TestTraining(object):
         full_form, lemma, min_rule_length = test_input
         actual = _find_suffix_start(full_form, lemma, min_rule_length)
         assert actual == expected
+
+    def test_fit_parallel(self):
+        """Test that training word classes in parallel yields the same rules as training serially."""
+        X, y = _prepare([('noun', 'skaber', 'skaber'), ('noun', 'venskaber', 'venskab'), ('verb', 'skaber', 'skabe'),
+                         ('verb', 'sprang', 'springe'), ('noun', 'alen', 'alen'), ('noun', 'alen', 'ale'),
+                         ('adj', 'sødeste', 'sød'), ('verb', 'løb', 'løbe'), ('noun', 'løb', 'løb')])
+        serial = lemmy.Lemmatizer()
+        serial.fit(X, y)
+        parallel = lemmy.Lemmatizer()
+        parallel.fit(X, y, n_jobs=2)
+        assert {word_class: dict(rules) for word_class, rules in parallel.rules.items()} == \
+            {word_class: dict(rules) for word_class, rules in serial.rules.items()}
+
+    def test_rule_counts(self):
+        """Test that rule counts maintained during training match the trained rules."""
+        X, y = _prepare([('noun', 'skaber', 'skaber'), ('noun', 'venskaber', 'venskab'), ('noun', 'alen', 'alen'),
+                         ('noun', 'alen', 'ale'), ('verb', 'sprang', 'springe'), ('verb', 'sprang', 'springe')])
+        lemmatizer = lemmy.Lemmatizer()
+        lemmatizer.fit(X, y)
+        expected = {word_class: sum(len(lemmas) for lemmas in rules.values())
+                    for word_class, rules in lemmatizer.rules.items()}
+        assert lemmatizer.rule_counts == expected
+        assert lemmatizer.rule_count == sum(expected.values())
+
+        lemmatizer.rules = {'noun': {'er': [('', False)], 'alen': [('alen', True), ('ale', True)]}}
+        assert lemmatizer.rule_counts == {'noun': 3}
+        assert lemmatizer.rule_count == 3
+
+    @pytest.mark.parametrize("max_iteration", [1, 2, 20])
+    def test_fit_worklist(self, max_iteration):
+        """Test that training using a worklist yields the same rules as revisiting every example in every epoch."""
+        X, y = _prepare([('noun', 'skaber', 'skaber'), ('noun', 'venskaber', 'venskab'), ('noun', 'skab', 'skab'),
+                         ('noun', 'alen', 'alen'), ('noun', 'alen', 'ale'), ('noun', 'kvalen', 'kval'),
+                         ('noun', 'hvalen', 'hval'), ('noun', 'malen', 'male'), ('noun', 'en', 'en'),
+                         ('verb', 'sprang', 'springe'), ('verb', 'rang', 'ringe'), ('verb', 'ang', 'ange')])
+        full = lemmy.Lemmatizer()
+        full.fit(X, y, max_iteration=max_iteration)
+        worklist = lemmy.Lemmatizer()
+        worklist.fit(X, y, max_iteration=max_iteration, worklist=True)
+        assert {word_class: dict(rules) for word_class, rules in worklist.rules.items()} == \
+            {word_class: dict(rules) for word_class, rules in full.rules.items()}
@@ -0,0 +1,75 @@
+# coding: utf-8
+"""Tests for the trie lookup engine."""
+# pylint: disable=protected-access,too-many-public-methods,no-self-use,too-few-public-methods,redefined-outer-name
+from __future__ import unicode_literals
+
+import pytest
+
+import lemmy
+from lemmy.lemmatizer import _longest_matching_rule
+
+
+@pytest.fixture(scope="module")
+def rules(request):
+    return lemmy.load("sv").rules
+
+
+def _words(rules, per_class=200):
+    for word_class in rules:
+        for index, full_form_suffix in enumerate(rules[word_class]):
+            if index >= per_class:
+                break
+            yield word_class, full_form_suffix
+            yield word_class, "xå" + full_form_suffix
+            yield word_class, full_form_suffix[1:]
+    yield "UNKNOWN", "ord"
+
+
+class TestTrie(object):
+    """Test class for the trie lookup engine."""
+
+    def test_identical_rules(self, rules):
+        """Test that the trie finds the same rules as the dict engine."""
+        lemmatizer = lemmy.Lemmatizer(rules, engine="trie")
+        for word_class, full_form in _words(rules):
+            full_form_suffix, lemma_suffixes = _longest_matching_rule(rules, word_class, full_form)
+            offset, actual_lemma_suffixes = lemmatizer._longest_matching_rule(word_class, full_form)
+            if full_form_suffix:
+                assert full_form[offset:] == full_form_suffix
+                assert actual_lemma_suffixes == lemma_suffixes
+            else:
+                assert offset is None
+
+    def test_identical_lemmas(self, rules):
+        """Test that the trie and dict engines yield the same lemmas."""
+        dict_lemmatizer = lemmy.Lemmatizer(rules, engine="dict")
+        trie_lemmatizer = lemmy.Lemmatizer(rules, engine="trie")
+        for word_class, full_form in _words(rules):
+            for pos_previous in [None, "", "DET"]:
+                expected = dict_lemmatizer.lemmatize(word_class, full_form, pos_previous)
+                assert trie_lemmatizer.lemmatize(word_class, full_form, pos_previous) == expected
+
+    def test_fit(self):
+        """Test that the trie reflects rules learned by fitting."""
+        lemmatizer = lemmy.Lemmatizer(engine="trie")
+        lemmatizer.fit([('noun', 'skaber'), ('noun', 'venskaber')], ['skaber', 'venskab'])
+        assert lemmatizer.lemmatize('noun', 'skaber') == ['skaber']
+        assert lemmatizer.lemmatize('noun', 'venskaber') == ['venskab']
+
+    def test_unknown_engine(self):
+        """Test that specifying an unknown engine fails."""
+        with pytest.raises(ValueError):
+            lemmy.Lemmatizer(engine="unknown")
+
+    def test_whole_words(self, rules):
+        """Test that locked whole word rules are found in the whole word table."""
+        lemmatizer = lemmy.Lemmatizer(rules, engine="trie")
+        assert lemmatizer.lemmatize('AUX', 'är') == ['vara']
+        whole_word_rules = lemmatizer._whole_words.word_class_rules('AUX')
+        assert whole_word_rules['är'] == rules['AUX']['är']
+        assert all(rules_list[0][1] for rules_list in whole_word_rules.values())
+
+    def test_no_whole_words_for_dict_engine(self, rules):
+        """Test that the dict engine, which finds whole words on its first probe, builds no whole word table."""
+        assert lemmy.Lemmatizer(rules)._whole_words is None
+        assert lemmy.load("sv")._whole_words is None